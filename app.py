@@ -1,17 +1,44 @@
+import time
+SCRIPT_STARTED = time.perf_counter()
 import streamlit as st
-from langchain_groq import ChatGroq
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import os
 from utils import (
     extract_key_requirements,
-    score_candidate_explainable,
     generate_interview_questions,
-    extract_pdf_text,
-    create_candidate_rag_retriever,
-    ask_rag_question,
-    generate_email_templates,
+    iter_extracted_resumes,
+    get_candidate_retriever,
+    get_embedding_stats,
+    get_json_parse_stats,
+    stream_rag_answer,
+    iter_broadcast_answers,
+    BROADCAST_SCORE_THRESHOLD,
+    iter_email_templates,
+    score_resume,
+    score_resume_batch,
+    pack_resumes,
+    PACKED_MAX_RESUMES,
+    RateLimiter,
+    rank_candidates,
+    scoring_error_result,
+    rescore_candidates,
+    select_candidates,
+    CANDIDATE_SORT_KEYS,
+    CandidateMatrix,
+    prescreen_resumes,
+    LLMCache,
+    configure_llm_cache,
+    get_llm_cache,
+    get_job_store,
+    DuplicateDetector,
+    iter_unique_resumes,
+    warm_up_in_background,
+    build_model_router,
+    MODEL_TIMEOUT_SECONDS,
 )
-import time
 import json
+from metrics import REGISTRY
+from worker import AnalysisQueue
 
 st.set_page_config(
     page_title="RecruitX | AI-Powered Hiring",
@@ -19,13 +46,49 @@ st.set_page_config(
     layout="wide",
 )
 
+SCORING_MAX_WORKERS = int(os.environ.get("RECRUITX_SCORING_WORKERS", 4))
+
+@st.cache_resource
+def enable_llm_cache():
+    """Repeated prompts (re-runs, re-uploads, reruns) are answered from disk instead of Groq."""
+    if os.environ.get("RECRUITX_LLM_CACHE", "1") != "0":
+        configure_llm_cache(LLMCache())
+    return get_llm_cache()
+
+@st.cache_resource
+def get_analysis_queue():
+    """One pool of scoring workers for the whole process, shared round-robin between sessions."""
+    return AnalysisQueue(max_workers=SCORING_MAX_WORKERS)
+
+@st.cache_resource
+def get_llm():
+    """One model router for the whole process: each task goes to its model tier and fails over when that model is throttled.
+
+    Groq meters quotas per model, so each model has its own rate limiter, shared by every session in this process.
+    """
+    from langchain_groq import ChatGroq
+    api_key = st.secrets["GROQ_API_KEY"]
+    # Groq's own retries would keep a throttled model busy; the router fails over instead and call_with_rate_limit_retry backs off.
+    return build_model_router(
+        lambda model: ChatGroq(model=model, temperature=0.1, api_key=api_key, timeout=MODEL_TIMEOUT_SECONDS, max_retries=0),
+        make_rate_limiter=lambda model: RateLimiter(
+            requests_per_minute=int(os.environ.get("GROQ_REQUESTS_PER_MINUTE", 30)),
+            tokens_per_minute=int(os.environ.get("GROQ_TOKENS_PER_MINUTE", 6000)),
+        ),
+    )
+
+@st.cache_resource
+def get_process_start() -> float:
+    """When the first script run in this process began; lets the startup metric tell cold starts apart."""
+    return SCRIPT_STARTED
+
+enable_llm_cache()
+if os.environ.get("RECRUITX_WARM_UP", "1") != "0":
+    warm_up_in_background()  # the embedding model and FAISS load while the user fills in the upload page
+
 if 'llm' not in st.session_state:
     try:
-        st.session_state.llm = ChatGroq(
-            model="llama3-70b-8192",
-            temperature=0.1,
-            api_key=st.secrets["GROQ_API_KEY"]
-        )
+        st.session_state.llm = get_llm()
     except (KeyError, FileNotFoundError):
         st.error("🔴 GROQ_API_KEY not found. Please set it as an environment variable.")
         st.stop()
@@ -133,10 +196,16 @@ if "step" not in st.session_state:
     st.session_state.candidates = []
     st.session_state.key_requirements = []
     st.session_state.chat_histories = {} 
-    st.session_state.rag_retrievers = {}
     st.session_state.compare_list = []
     st.session_state.saved_job_description = ""
     st.session_state.saved_resume_files = []
+    st.session_state.weighted_reqs = {}
+    st.session_state.screened_out = []
+    st.session_state.rag_settings = {"k": 4, "search_type": "similarity", "score_threshold": None}
+    st.session_state.interview_questions = {}
+    st.session_state.job_id = None
+    st.session_state.task_id = None
+    st.session_state.duplicates = {}
 
 
 def proceed_to_weighting():
@@ -156,70 +225,299 @@ def proceed_to_weighting():
         except Exception as e:
             st.error(f"An error occurred during AI analysis: {e}")
 
+def current_session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "default"
+
 def run_final_analysis(weighted_reqs, resume_files, job_description):
-    with st.spinner("Performing deep analysis on all candidates..."):
-        resumes_to_process = []
-        for file in resume_files:
-            text = extract_pdf_text(file)
-            if text:
-                resumes_to_process.append({"text": text, "filename": file.name})
-        candidate_results = []
-        progress_bar = st.progress(0, "Analyzing candidates...")
-        total_candidates = len(resumes_to_process)
-
-        for i, res in enumerate(resumes_to_process):
-            try:
-                progress_bar.progress((i + 1) / total_candidates, f"Analyzing {res['filename']}...")
-                score_data = score_candidate_explainable(job_description, res["text"], weighted_reqs, st.session_state.llm)
-                result_dict = score_data.model_dump()
-                result_dict['filename'] = res['filename']
-                candidate_results.append(result_dict)
-                
-            except Exception as e:
-                print(f"Error processing {res['filename']}: {e}")
-                error_result = {
-                    "name": f"Error: {res['filename']}",
-                    "overall_score": 0,
-                    "summary": f"The AI failed to process this resume. Please check the file. Error: {e}",
-                    "requirement_analysis": [],
-                    "filename": res['filename']
-                }
-                candidate_results.append(error_result)
-            
-            time.sleep(1)
-        
-        progress_bar.empty()
-        st.session_state.candidates = sorted(candidate_results, key=lambda x: x['overall_score'], reverse=True)
-        
-        st.session_state.rag_retrievers = {}
-        st.session_state.chat_histories = {}
-        for candidate in st.session_state.candidates:
-            if "Error:" not in candidate['name']:
-                candidate_name = candidate['name']
-                full_text_info = next((res for res in resumes_to_process if res['filename'] == candidate.get('filename')), None)
-                if full_text_info:
-                    retriever = create_candidate_rag_retriever(full_text_info['text'], full_text_info['filename'])
-                    st.session_state.rag_retrievers[candidate_name] = retriever
-                    st.session_state.chat_histories[candidate_name] = []
-
-        st.session_state.step = "results"
+    """Queues the batch on the shared workers and opens the results page, which fills in as candidates are scored.
+
+    Everything below runs on worker threads and must not touch st.*; progress is read back through the task.
+    """
+    job_store = get_job_store()
+    job_id = job_store.save_job(job_description, weighted_reqs)
+    already_scored = job_store.scored_file_hashes(job_id)
+    stored_by_hash = {c['file_hash']: c for c in job_store.load_candidates(job_id)}
+    stored_texts = job_store.load_texts(job_id)
+    detector = DuplicateDetector()
+    for candidate in stored_by_hash.values():
+        if not candidate.get('duplicate_of'):
+            detector.add(candidate['file_hash'], stored_texts[candidate['file_hash']])
+
+    llm = st.session_state.llm
+    prescreen = (st.session_state.prescreen_top_k, st.session_state.prescreen_threshold) if st.session_state.get("prescreen_enabled") else None
+    packed = st.session_state.get("packed_scoring", False)
+    notes = {"skipped": [], "duplicates": [], "screened_out": []}
+    texts_by_hash = {}
+
+    def new_resumes():
+        seen = set(already_scored)
+        for resume in iter_extracted_resumes(resume_files):
+            if resume['file_hash'] in seen:
+                notes['skipped'].append(resume['filename'])
+            else:
+                seen.add(resume['file_hash'])
+                yield resume
+
+    def resumes_to_score():
+        unique = iter_unique_resumes(new_resumes(), detector, notes['duplicates'].append)
+        if prescreen:
+            unique, notes['screened_out'] = prescreen_resumes(weighted_reqs, list(unique), top_k=prescreen[0], threshold=prescreen[1])
+        for resume in unique:
+            texts_by_hash[resume['file_hash']] = resume['text']
+            yield resume
+
+    def save_result(result):
+        if "Error:" not in result['name']:
+            job_store.save_candidates(job_id, [result], texts_by_hash)
+
+    def finish(task):
+        scored = [c for c in task.results if "Error:" not in c['name']]
+        representatives = {**stored_by_hash, **{c['file_hash']: c for c in scored}}
+        linked_duplicates = [
+            {**representatives[dup['duplicate_of']], "filename": dup['filename'], "file_hash": dup['file_hash'], "duplicate_of": dup['duplicate_of'], "duplicate_similarity": dup['duplicate_similarity']}
+            for dup in notes['duplicates'] if dup['duplicate_of'] in representatives
+        ]
+        job_store.save_candidates(job_id, linked_duplicates, {dup['file_hash']: dup['text'] for dup in notes['duplicates']})
+        # A copy of a resume that failed (or was cancelled before scoring) gets its own error row rather than vanishing.
+        task.results.extend(
+            {**scoring_error_result(dup['filename'], "a near-identical resume in this batch could not be scored"), "file_hash": dup['file_hash']}
+            for dup in notes['duplicates'] if dup['duplicate_of'] not in representatives
+        )
+        notes['metrics'] = task.metrics.summary()
+        if os.environ.get("RECRUITX_METRICS_FILE"):
+            REGISTRY.write(os.environ["RECRUITX_METRICS_FILE"])
+
+    task = get_analysis_queue().submit(
+        current_session_id(),
+        pack_resumes(resumes_to_score()) if packed else resumes_to_score(),
+        (lambda pack: score_resume_batch(job_description, pack, weighted_reqs, llm)) if packed else (lambda resume: score_resume(job_description, resume, weighted_reqs, llm)),
+        expected=len(resume_files),
+        on_result=save_result,
+        on_finish=finish,
+        batched=packed,
+        notes=notes,
+    )
+    st.session_state.task_id = task.task_id
+    st.session_state.task_results_seen = 0
+    st.session_state.screened_out = []
+    open_job(job_id)
+
+def cancel_analysis():
+    get_analysis_queue().cancel(st.session_state.task_id)
+
+@st.fragment(run_every=2)
+def analysis_progress():
+    """Polls the running batch: shows progress and the latest scored candidates, and finalises the page when it ends.
+
+    While the batch runs only this fragment reruns; newly scored candidates are loaded into the session, so the rest
+    of the page picks them up on the user's next interaction, and the whole page reruns once when the batch ends.
+    """
+    task = get_analysis_queue().get(st.session_state.task_id)
+    if task is None:
+        st.session_state.task_id = None
+        st.rerun()
+    progress = task.progress()
+    failed = [c for c in list(task.results) if "Error:" in c['name']]
+    if task.active:
+        label = "Cancelling: waiting for candidates already being scored..." if progress['cancel_requested'] else f"Analyzed {progress['done']} of ~{progress['expected']} candidates ({progress['in_flight']} in progress)"
+        st.progress(min(1.0, progress['done'] / max(progress['expected'], 1)), label)
+        st.button("⏹️ Cancel Analysis", on_click=cancel_analysis, disabled=progress['cancel_requested'])
+        if progress['done'] != st.session_state.task_results_seen:
+            st.session_state.task_results_seen = progress['done']
+            load_job(st.session_state.job_id, failed=failed)
+        for candidate in list(task.results)[-5:][::-1]:
+            st.caption(f"✓ {candidate['name']}: {candidate['overall_score']}%")
+        return
+
+    load_job(st.session_state.job_id, failed=failed)
+    st.session_state.screened_out = task.notes.get('screened_out', [])
+    st.session_state.run_metrics = task.notes.get('metrics')
+    st.session_state.task_id = None
+    if task.notes.get('skipped'):
+        st.toast(f"{len(task.notes['skipped'])} resume(s) were already analysed for this job (or uploaded twice) and were not scored again.")
+    if task.notes.get('duplicates'):
+        st.toast(f"{len(task.notes['duplicates'])} duplicate resume(s) were linked to an existing candidate instead of being scored.")
+    if task.status == "cancelled":
+        st.toast(f"Analysis cancelled after {progress['done']} candidate(s).")
+    elif task.status == "failed":
+        st.toast(f"Analysis stopped: {task.error}")
+    st.rerun()
+
+def apply_new_weights():
+    """Re-ranks the analysed candidates under the weights edited on the results page, without new LLM calls."""
+    weighted_reqs = {}
+    for req in st.session_state.weighted_reqs:
+        weighted_reqs[req] = { "importance": st.session_state[f"rw_imp_{req}"], "knockout": st.session_state[f"rw_ko_{req}"] }
+    st.session_state.weighted_reqs = weighted_reqs
+    st.session_state.candidates = rescore_candidates(st.session_state.candidates, weighted_reqs)
+    if st.session_state.job_id:
+        duplicates = [dup for dups in st.session_state.duplicates.values() for dup in dups]
+        rescored = [c for c in st.session_state.candidates if "Error:" not in c['name']] + rescore_candidates(duplicates, weighted_reqs)
+        st.session_state.job_id = get_job_store().copy_job(st.session_state.job_id, weighted_reqs, rescored)
+        st.query_params["job"] = st.session_state.job_id
+
+def apply_rag_settings():
+    """Applies the chat retrieval settings to every candidate; each chat chain is rebuilt once on its next message."""
+    st.session_state.rag_settings = {
+        "k": st.session_state.rag_k,
+        "search_type": "mmr" if st.session_state.rag_mmr else "similarity",
+        "score_threshold": st.session_state.rag_threshold or None,
+    }
+
+LEADERBOARD_PAGE_SIZES = [10, 25, 50, 100]
+
+def reset_leaderboard_page():
+    st.session_state.leaderboard_page = 1
+
+def candidate_matrix() -> CandidateMatrix:
+    """The candidates x requirements matrix for the current candidate list, rebuilt only when the list or requirements change."""
+    key = (id(st.session_state.candidates), tuple(st.session_state.weighted_reqs))
+    cached = st.session_state.get("candidate_matrix")
+    if cached is None or cached[0] != key:
+        cached = (key, CandidateMatrix(st.session_state.candidates, st.session_state.weighted_reqs))
+        st.session_state.candidate_matrix = cached
+    return cached[1]
+
+@st.fragment
+def render_candidate_tools(candidate):
+    """Interview questions and chat for one candidate. Interactions rerun only this fragment, not the whole page."""
+    key = candidate_key(candidate)
+    if st.button("🤖 Generate Interview Questions", key=f"gen_q_{key}"):
+        with st.spinner("Generating..."):
+            st.session_state.interview_questions[key] = generate_interview_questions(candidate['name'], candidate['summary'], st.session_state.saved_job_description, st.session_state.llm)
+    questions = st.session_state.interview_questions.get(key)
+    if questions:
+        st.markdown("<h5>Behavioral Questions:</h5>", unsafe_allow_html=True)
+        for q in questions.behavioral: st.markdown(f"- {q}")
+        st.markdown("<h5>Technical Questions:</h5>", unsafe_allow_html=True)
+        for q in questions.technical: st.markdown(f"- {q}")
+
+    st.markdown("<hr style='border-color:var(--border-color); margin: 1.5rem 0;'>", unsafe_allow_html=True)
+    st.markdown("<h5>💬 Chat about this Candidate</h5>", unsafe_allow_html=True)
+    chat_container = st.container(height=200)
+    with chat_container:
+        if key in st.session_state.chat_histories:
+            for msg in st.session_state.chat_histories[key]:
+                st.markdown(f"<div class='chat-bubble {msg['role']}'>{msg['content']}</div>", unsafe_allow_html=True)
+
+    if prompt := st.chat_input("Ask about this candidate...", key=f"chat_{key}"):
+        st.session_state.chat_histories.setdefault(key, []).append({"role": "user", "content": prompt})
+        if st.session_state.job_id and candidate.get('file_hash'):
+            get_job_store().append_chat_message(st.session_state.job_id, candidate['file_hash'], "user", prompt)
+        if candidate.get('candidate_id'):
+            retriever = get_candidate_retriever(st.session_state.saved_job_description, candidate['candidate_id'], lambda: load_resume(candidate), **st.session_state.rag_settings)
+            with chat_container:
+                st.markdown(f"<div class='chat-bubble user'>{prompt}</div>", unsafe_allow_html=True)
+                answer_bubble = st.empty()
+                answer = ""
+                for token in stream_rag_answer(retriever, prompt, st.session_state.llm):
+                    answer += token
+                    answer_bubble.markdown(f"<div class='chat-bubble assistant'>{answer}▌</div>", unsafe_allow_html=True)
+                answer_bubble.markdown(f"<div class='chat-bubble assistant'>{answer}</div>", unsafe_allow_html=True)
+                st.session_state.chat_histories[key].append({"role": "assistant", "content": answer})
+                if st.session_state.job_id and candidate.get('file_hash'):
+                    get_job_store().append_chat_message(st.session_state.job_id, candidate['file_hash'], "assistant", answer)
+
+
+def render_candidate_card(candidate):
+    """Renders one leaderboard card; its interactive tools rerun on their own as a fragment."""
+    st.markdown('<div class="input-card" style="margin-bottom: 1.5rem;">', unsafe_allow_html=True)
+    candidate_name = candidate['name']
+    col1, col2 = st.columns([3, 1])
+    with col1: st.markdown(f"<h3 class='candidate-name'>{candidate_name}</h3>", unsafe_allow_html=True)
+    with col2: st.progress(candidate['overall_score'], text=f"Overall Score: {candidate['overall_score']}%")
+    if candidate.get('knocked_out'):
+        st.markdown("<p style='color: #dc3545;'><b>⛔ Knocked out:</b> missing a deal-breaker requirement.</p>", unsafe_allow_html=True)
+    st.markdown(f"<p style='color: var(--subtle-text-color);'>{candidate['summary']}</p>", unsafe_allow_html=True)
+    for duplicate in st.session_state.get('duplicates', {}).get(candidate_key(candidate), []):
+        st.caption(f"📎 Also submitted as {duplicate['filename']} ({duplicate['duplicate_similarity']:.0%} similar); not scored separately.")
+
+    if "Error:" not in candidate_name:
+        with st.expander("View Detailed Requirement Analysis (XAI)"):
+            for req in candidate['requirement_analysis']:
+                if req['match_status']: st.markdown(f"<div class='xai-item xai-met'><b>✅ Met:</b> {req['requirement']}<br><small><i><b>Evidence:</b> \"{req['evidence']}\"</i></small></div>", unsafe_allow_html=True)
+                else: st.markdown(f"<div class='xai-item xai-gap'><b>❌ Gap:</b> {req['requirement']}<br><small><i><b>Reason:</b> {req['evidence']}</i></small></div>", unsafe_allow_html=True)
+        render_candidate_tools(candidate)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def candidate_key(candidate):
+    """Stable per-resume key for session state and widgets; names can repeat across resumes, file hashes cannot."""
+    return candidate.get('file_hash') or candidate['filename']
+
+def load_job(job_id, failed=()):
+    """Loads a stored job's ranked results, duplicates and chat history into the session.
+
+    Nothing is embedded here: a candidate's resume is indexed the first time someone chats about them.
+    """
+    job_store = get_job_store()
+    job = job_store.get_job(job_id)
+    stored = job_store.load_candidates(job_id)
+    histories = job_store.load_chat_histories(job_id)
+    duplicates = {}
+    for c in stored:
+        if c.get('duplicate_of'):
+            duplicates.setdefault(c['duplicate_of'], []).append(c)
+    stored = [c for c in stored if not c.get('duplicate_of')]
+    st.session_state.job_id = job_id
+    st.session_state.saved_job_description = job['job_description']
+    st.session_state.weighted_reqs = job['weighted_requirements']
+    st.session_state.key_requirements = list(job['weighted_requirements'])
+    st.session_state.candidates = rank_candidates(stored + list(failed))
+    st.session_state.duplicates = duplicates
+    st.session_state.chat_histories = {candidate_key(c): histories.get(c['file_hash'], []) for c in stored}
+
+def load_resume(candidate):
+    """Stored resume of a candidate of the open job, for indexing it on first chat."""
+    return {"text": get_job_store().load_text(st.session_state.job_id, candidate['file_hash']), "filename": candidate['filename'], "name": candidate['name']}
+
+def open_job(job_id, failed=()):
+    """Opens a stored job on the results page and records it in the URL, so a refresh reopens it."""
+    load_job(job_id, failed)
+    st.session_state.interview_questions = {}
+    st.session_state.generated_emails = {}
+    st.session_state.broadcast = None
+    st.session_state.leaderboard_page = 1
+    st.session_state.step = "results"
+    st.query_params["job"] = job_id
+
+def open_selected_job():
+    open_job(st.session_state.saved_job_choice)
+
+def add_resumes_to_job():
+    """Scores only the newly uploaded resumes and merges them into the open job."""
+    if st.session_state.add_resume_files:
+        run_final_analysis(st.session_state.weighted_reqs, st.session_state.add_resume_files, st.session_state.saved_job_description)
 
 def go_back_to_upload():
     """Resets the state to go back to the first step."""
     st.session_state.step = "upload"
     st.session_state.key_requirements = []
+    st.session_state.job_id = None
+    st.session_state.task_id = None  # a running batch keeps going and saves into its job; it can be reopened later
+    st.query_params.clear()
 
 def trigger_analysis():
     weighted_reqs = {}
     for req in st.session_state.key_requirements:
         weighted_reqs[req] = { "importance": st.session_state[f"imp_{req}"], "knockout": st.session_state[f"ko_{req}"] }
+    st.session_state.weighted_reqs = weighted_reqs
     run_final_analysis(weighted_reqs, st.session_state.saved_resume_files, st.session_state.saved_job_description)
 
 
 st.markdown('<div class="main-content-wrapper fade-in">', unsafe_allow_html=True)
 st.markdown('<div class="header"><h1>RecruitX</h1><p>AI-Powered Talent Analysis. From Resumes to Revenue in Minutes.</p></div>', unsafe_allow_html=True)
 
+if st.session_state.step == "upload" and st.query_params.get("job") and get_job_store().get_job(st.query_params["job"]):
+    open_job(st.query_params["job"])
+
 if st.session_state.step == "upload":
+    saved_jobs = get_job_store().list_jobs()
+    if saved_jobs:
+        with st.expander(f"📂 Open a saved job ({len(saved_jobs)})"):
+            jobs_by_id = {job['job_id']: job for job in saved_jobs}
+            st.selectbox("Saved job", list(jobs_by_id), key="saved_job_choice", format_func=lambda job_id: f"{jobs_by_id[job_id]['title']} · {jobs_by_id[job_id]['candidates']} candidates", label_visibility="collapsed")
+            st.button("Open Job", on_click=open_selected_job, use_container_width=True)
     st.markdown('<div class="input-card">', unsafe_allow_html=True)
     st.markdown("<h2 class='section-header'>Step 1: Provide Your Data</h2>", unsafe_allow_html=True)
     col1, col2 = st.columns(2, gap="large")
@@ -243,8 +541,14 @@ elif st.session_state.step == "weighting":
         cols = st.columns([4, 2, 1])
         with cols[0]: st.write(f"▸ {req}")
         with cols[1]: st.selectbox("Importance", ["Normal", "Important", "Critical"], key=f"imp_{req}", index=1, label_visibility="collapsed")
-        with cols[2]: st.checkbox("Knock-Out?", key=f"ko_{req}", help="If unchecked, this requirement is a deal-breaker.")
+        with cols[2]: st.checkbox("Knock-Out?", key=f"ko_{req}", help="If checked, missing this requirement is a deal-breaker.")
         st.markdown('</div>', unsafe_allow_html=True)
+    with st.expander("🔎 Pre-screen large applicant pools (optional)"):
+        st.checkbox("Only send the closest matches to full AI scoring", key="prescreen_enabled", help="Resumes are ranked by embedding similarity to the requirements; the rest are listed as screened out.")
+        pre_cols = st.columns(2)
+        with pre_cols[0]: st.number_input("Candidates to score (top K)", min_value=1, value=max(1, min(50, len(st.session_state.saved_resume_files or []))), key="prescreen_top_k")
+        with pre_cols[1]: st.slider("Minimum similarity", 0.0, 1.0, 0.0, 0.01, key="prescreen_threshold")
+    st.checkbox("Pack short resumes into shared scoring calls", key="packed_scoring", help=f"Up to {PACKED_MAX_RESUMES} short resumes are scored per AI call, so the job description and requirements are sent once. Any resume whose entry fails validation is re-scored on its own.")
     st.markdown("<br>", unsafe_allow_html=True)
     btn_cols = st.columns(2)
     with btn_cols[0]:
@@ -260,60 +564,115 @@ elif st.session_state.step == "weighting":
 # PASTE THIS ENTIRE BLOCK INTO YOUR app.py
 
 elif st.session_state.step == "results":
-    st.success("✅ Analysis Complete! Explore your results below.")
-    tabs = st.tabs(["🏆 Leaderboard", "🤝 Compare Candidates", "✉️ Email Drafts"])
+    analysis_running = bool(st.session_state.get('task_id'))
+    if analysis_running:
+        st.info("⏳ Analysis is running in the background. Scored candidates are added to the results below as you keep exploring; the page refreshes when the batch ends.")
+        analysis_progress()
+    else:
+        st.success("✅ Analysis Complete! Explore your results below.")
+    job_cols = st.columns([3, 1])
+    with job_cols[0]:
+        with st.expander("➕ Add resumes to this job"):
+            st.file_uploader("Additional resumes", type=["pdf"], accept_multiple_files=True, key="add_resume_files", label_visibility="collapsed")
+            st.button("Analyze New Resumes", on_click=add_resumes_to_job, use_container_width=True, disabled=analysis_running, help="Resumes already analysed for this job are skipped.")
+    with job_cols[1]:
+        st.button("🆕 Start a New Job", on_click=go_back_to_upload, use_container_width=True)
+    if get_llm_cache():
+        cache_stats = get_llm_cache().stats()
+        st.caption(f"LLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses ({cache_stats['entries']} stored responses).")
+    parse_stats = get_json_parse_stats()
+    if parse_stats['local_repair'] or parse_stats['llm_repair'] or parse_stats['failed']:
+        st.caption(f"AI output parsing: {parse_stats['direct']} clean, {parse_stats['local_repair']} repaired locally, {parse_stats['llm_repair']} repaired by AI, {parse_stats['failed']} failed.")
+    embedding_stats = get_embedding_stats()
+    if embedding_stats['chunks']:
+        st.caption(f"Embeddings: {embedding_stats['chunks']} chunks at {embedding_stats['ms_per_chunk']:.1f} ms/chunk (model load {embedding_stats['model_load_seconds']:.1f}s).")
+    if st.session_state.get('run_metrics'):
+        with st.expander("📊 Run Metrics"):
+            run_metrics = st.session_state.run_metrics
+            st.markdown("<h5>Latency by stage</h5>", unsafe_allow_html=True)
+            st.dataframe([{"Series": series, **values} for series, values in run_metrics['histograms'].items()], use_container_width=True, hide_index=True)
+            st.markdown("<h5>Counters</h5>", unsafe_allow_html=True)
+            st.dataframe([{"Series": series, "Value": value} for series, value in run_metrics['counters'].items()], use_container_width=True, hide_index=True)
+            export_cols = st.columns(2)
+            with export_cols[0]: st.download_button("Download Prometheus metrics", REGISTRY.to_prometheus(), file_name="recruitx_metrics.prom", use_container_width=True)
+            with export_cols[1]: st.download_button("Download JSON metrics", REGISTRY.to_json(), file_name="recruitx_metrics.json", use_container_width=True)
+    if st.session_state.weighted_reqs:
+        with st.expander("⚖️ Adjust Requirement Weights & Re-rank"):
+            importance_levels = ["Normal", "Important", "Critical"]
+            for req, weight in st.session_state.weighted_reqs.items():
+                cols = st.columns([4, 2, 1])
+                with cols[0]: st.write(f"▸ {req}")
+                with cols[1]: st.selectbox("Importance", importance_levels, key=f"rw_imp_{req}", index=importance_levels.index(weight['importance']), label_visibility="collapsed")
+                with cols[2]: st.checkbox("Knock-Out?", key=f"rw_ko_{req}", value=weight['knockout'])
+            st.button("Re-rank Candidates", on_click=apply_new_weights, use_container_width=True, disabled=analysis_running)
+    if any(c.get('candidate_id') for c in st.session_state.candidates):
+        with st.expander("💬 Chat Retrieval Settings"):
+            rag_settings = st.session_state.rag_settings
+            cols = st.columns(3)
+            with cols[0]: st.slider("Passages per answer (k)", 1, 10, value=rag_settings['k'], key="rag_k")
+            with cols[1]: st.slider("Minimum relevance", 0.0, 1.0, value=rag_settings['score_threshold'] or 0.0, step=0.05, key="rag_threshold", help="Passages less similar to the question than this are not sent to the AI. 0 keeps every passage.")
+            with cols[2]: st.checkbox("Diverse passages (MMR)", value=rag_settings['search_type'] == "mmr", key="rag_mmr", help="Prefer passages that cover different parts of the resume over near-duplicates.")
+            st.button("Apply Chat Settings", on_click=apply_rag_settings, use_container_width=True)
+    tabs = st.tabs(["🏆 Leaderboard", "🤝 Compare Candidates", "✉️ Email Drafts", "📣 Ask All Candidates"])
     
     with tabs[0]:
         # This part is for the Leaderboard
         if not st.session_state.candidates:
             st.info("No candidates were processed. Please go back and upload resumes.")
         
-        for candidate in st.session_state.candidates:
-            st.markdown('<div class="input-card" style="margin-bottom: 1.5rem;">', unsafe_allow_html=True)
-            candidate_name = candidate['name']
-            col1, col2 = st.columns([3, 1])
-            with col1: st.markdown(f"<h3 class='candidate-name'>{candidate_name}</h3>", unsafe_allow_html=True)
-            with col2: st.progress(candidate['overall_score'], text=f"Overall Score: {candidate['overall_score']}%")
-            st.markdown(f"<p style='color: var(--subtle-text-color);'>{candidate['summary']}</p>", unsafe_allow_html=True)
-            
-            if "Error:" not in candidate_name:
-                with st.expander("View Detailed Requirement Analysis (XAI)"):
-                    for req in candidate['requirement_analysis']:
-                        if req['match_status']: st.markdown(f"<div class='xai-item xai-met'><b>✅ Met:</b> {req['requirement']}<br><small><i><b>Evidence:</b> \"{req['evidence']}\"</i></small></div>", unsafe_allow_html=True)
-                        else: st.markdown(f"<div class='xai-item xai-gap'><b>❌ Gap:</b> {req['requirement']}<br><small><i><b>Reason:</b> {req['evidence']}</i></small></div>", unsafe_allow_html=True)
-                
-                if st.button("🤖 Generate Interview Questions", key=f"gen_q_{candidate_name}"):
-                    with st.spinner("Generating..."):
-                        questions = generate_interview_questions(candidate['name'], candidate['summary'], st.session_state.saved_job_description, st.session_state.llm)
-                        st.markdown("<h5>Behavioral Questions:</h5>", unsafe_allow_html=True)
-                        for q in questions.behavioral: st.markdown(f"- {q}")
-                        st.markdown("<h5>Technical Questions:</h5>", unsafe_allow_html=True)
-                        for q in questions.technical: st.markdown(f"- {q}")
-                
-                st.markdown("<hr style='border-color:var(--border-color); margin: 1.5rem 0;'>", unsafe_allow_html=True)
-                st.markdown("<h5>💬 Chat about this Candidate</h5>", unsafe_allow_html=True)
-                chat_container = st.container(height=200)
-                with chat_container:
-                    if candidate_name in st.session_state.chat_histories:
-                        for msg in st.session_state.chat_histories[candidate_name]:
-                            st.markdown(f"<div class='chat-bubble {msg['role']}'>{msg['content']}</div>", unsafe_allow_html=True)
-                
-                if prompt := st.chat_input("Ask about this candidate...", key=f"chat_{candidate_name}"):
-                    st.session_state.chat_histories[candidate_name].append({"role": "user", "content": prompt})
-                    retriever = st.session_state.rag_retrievers.get(candidate_name)
-                    if retriever:
-                        with chat_container:
-                            st.markdown(f"<div class='chat-bubble user'>{prompt}</div>", unsafe_allow_html=True)
-                            with st.spinner("Thinking..."):
-                                answer = ask_rag_question(retriever, prompt, st.session_state.llm)
-                                st.session_state.chat_histories[candidate_name].append({"role": "assistant", "content": answer})
-                                st.markdown(f"<div class='chat-bubble assistant'>{answer}</div>", unsafe_allow_html=True)
-            st.markdown('</div>', unsafe_allow_html=True)
+        matrix = candidate_matrix()
+        must_meet = [req for req in st.session_state.get("lb_must_meet", []) if req in matrix.requirements]
+        if "lb_must_meet" in st.session_state:
+            st.session_state.lb_must_meet = must_meet  # drop requirements that were renamed by a re-rank
+        leaderboard = select_candidates(
+            st.session_state.candidates,
+            search=st.session_state.get("lb_search", ""),
+            sort_by=st.session_state.get("lb_sort", "Rank"),
+            min_score=st.session_state.get("lb_min_score", 0),
+            hide_knocked_out=st.session_state.get("lb_hide_knocked_out", False),
+            hide_errors=st.session_state.get("lb_hide_errors", False),
+            require_all=must_meet,
+            matrix=matrix,
+        )
+        filter_cols = st.columns([3, 2, 2, 2])
+        with filter_cols[0]: st.text_input("Search", key="lb_search", placeholder="Name, summary or file...", on_change=reset_leaderboard_page)
+        with filter_cols[1]: st.selectbox("Sort by", list(CANDIDATE_SORT_KEYS), key="lb_sort", on_change=reset_leaderboard_page)
+        with filter_cols[2]: st.slider("Minimum score", 0, 100, 0, key="lb_min_score", on_change=reset_leaderboard_page)
+        with filter_cols[3]:
+            st.checkbox("Hide knocked-out", key="lb_hide_knocked_out", on_change=reset_leaderboard_page)
+            st.checkbox("Hide failed files", key="lb_hide_errors", on_change=reset_leaderboard_page)
+        if matrix.requirements:
+            st.multiselect("Must meet", matrix.requirements, key="lb_must_meet", placeholder="Only show candidates who meet all of these...", on_change=reset_leaderboard_page)
+
+        page_size = st.session_state.get("lb_page_size", LEADERBOARD_PAGE_SIZES[0])
+        page_count = max(1, -(-len(leaderboard) // page_size))
+        if st.session_state.get("leaderboard_page", 1) > page_count:
+            st.session_state.leaderboard_page = page_count
+        page = st.session_state.get("leaderboard_page", 1)
+        st.caption(f"Showing {min(len(leaderboard), (page - 1) * page_size + 1)}-{min(len(leaderboard), page * page_size)} of {len(leaderboard)} matching candidates ({len(st.session_state.candidates)} total).")
+        for candidate in leaderboard[(page - 1) * page_size:page * page_size]:
+            render_candidate_card(candidate)
+
+        page_cols = st.columns([1, 1, 3])
+        with page_cols[0]: st.number_input("Page", min_value=1, max_value=page_count, key="leaderboard_page")
+        with page_cols[1]: st.selectbox("Per page", LEADERBOARD_PAGE_SIZES, key="lb_page_size", on_change=reset_leaderboard_page)
+
+        if st.session_state.screened_out:
+            with st.expander(f"🔎 Screened out before AI scoring ({len(st.session_state.screened_out)})"):
+                st.dataframe(
+                    [{"File": r['filename'], "Similarity": r['prescreen_similarity'], **r['requirement_similarity']} for r in st.session_state.screened_out],
+                    use_container_width=True,
+                    hide_index=True,
+                )
 
     with tabs[1]:
+        matrix = candidate_matrix()
         st.multiselect("Select candidates to compare side-by-side:", [c['name'] for c in st.session_state.candidates if "Error:" not in c['name']], key="compare_list")
         if len(st.session_state.compare_list) > 1:
             compare_data = {c['name']: c for c in st.session_state.candidates if c['name'] in st.session_state.compare_list}
+            if matrix.requirements:
+                rows = [i for i, c in enumerate(matrix.candidates) if c['name'] in compare_data]
+                st.dataframe(matrix.requirement_table(rows), use_container_width=True, hide_index=True)
             cols = st.columns(len(st.session_state.compare_list))
             col_index = 0
             for name, data in compare_data.items():
@@ -347,42 +706,106 @@ elif st.session_state.step == "results":
                 interview_date = st.date_input("Interview Date")
                 interview_time = st.time_input("Interview Time")
             
-            if st.button("Generate All Emails", use_container_width=True, type="primary"):
-                with st.spinner("Crafting personalized emails..."):
-                    job_title = "the position"
-                    if st.session_state.saved_job_description:
-                        job_title = st.session_state.saved_job_description.splitlines()[0]
-
-                    interview_datetime_str = f"{interview_date.strftime('%A, %B %d, %Y')} at {interview_time.strftime('%I:%M %p')}"
-                    st.session_state.generated_emails = generate_email_templates(
-                        valid_candidates, 
-                        {"title": job_title}, 
-                        num_to_invite, 
-                        min_score, 
-                        interview_datetime_str, 
-                        st.session_state.llm
-                    )
-            
-            if 'generated_emails' in st.session_state and st.session_state.generated_emails:
+            generate_clicked = st.button("Generate All Emails", use_container_width=True, type="primary")
+            if generate_clicked or st.session_state.get('generated_emails'):
                 st.markdown("<hr style='border-color:var(--border-color); margin: 2rem 0;'>", unsafe_allow_html=True)
                 invite_col, reject_col = st.columns(2)
                 with invite_col:
                     st.markdown("<h4>✅ Invitations</h4>", unsafe_allow_html=True)
-                    invites = st.session_state.generated_emails.get('invitations', [])
-                    if invites:
-                        for email in invites:
-                            with st.expander(f"To: {email['name']}", expanded=True): st.code(email['email_body'], language=None)
-                    else:
-                        st.info("No candidates met the criteria for an invitation.")
+                    invite_container = st.container()
                 with reject_col:
                     st.markdown("<h4>❌ Rejections</h4>", unsafe_allow_html=True)
-                    rejects = st.session_state.generated_emails.get('rejections', [])
-                    if rejects:
-                        for email in rejects:
-                            with st.expander(f"To: {email['name']}", expanded=True): st.code(email['email_body'], language=None)
-                    else:
-                        st.info("No remaining candidates to send rejection emails to.")
+                    reject_container = st.container()
+
+                def render_email(container, email):
+                    with container:
+                        with st.expander(f"To: {email['name']}", expanded=True): st.code(email['email_body'], language=None)
+
+                if generate_clicked:
+                    job_title = "the position"
+                    if st.session_state.saved_job_description:
+                        job_title = st.session_state.saved_job_description.splitlines()[0]
+
+                    interview_datetime_str = f"{interview_date.strftime('%A, %B %d, %Y')} at {interview_time.strftime('%I:%M %p')}"
+                    st.session_state.generated_emails = {"invitations": [], "rejections": []}
+                    with st.spinner("Crafting personalized emails..."):
+                        for email_type, email in iter_email_templates(
+                            valid_candidates, 
+                            {"title": job_title}, 
+                            num_to_invite, 
+                            min_score, 
+                            interview_datetime_str, 
+                            st.session_state.llm,
+                            max_workers=SCORING_MAX_WORKERS,
+                        ):
+                            st.session_state.generated_emails[f"{email_type}s"].append(email)
+                            render_email(invite_container if email_type == "invitation" else reject_container, email)
+                else:
+                    for email in st.session_state.generated_emails.get('invitations', []):
+                        render_email(invite_container, email)
+                    for email in st.session_state.generated_emails.get('rejections', []):
+                        render_email(reject_container, email)
+
+                if not st.session_state.generated_emails.get('invitations'):
+                    with invite_container: st.info("No candidates met the criteria for an invitation.")
+                if not st.session_state.generated_emails.get('rejections'):
+                    with reject_container: st.info("No remaining candidates to send rejection emails to.")
         else:
             st.warning("⚠️ No valid candidate profiles were generated. Cannot create emails.")
 
+
+    with tabs[3]:
+        st.markdown("<h3 class='section-header'>📣 Ask Every Candidate</h3>", unsafe_allow_html=True)
+        askable = [c for c in st.session_state.candidates if c.get('candidate_id') and "Error:" not in c['name']]
+        if askable:
+            st.text_input("Question", key="broadcast_question", placeholder="Who has led a Kubernetes migration?")
+            broadcast_cols = st.columns(2)
+            with broadcast_cols[0]: st.slider("Minimum relevance", 0.0, 1.0, BROADCAST_SCORE_THRESHOLD, step=0.05, key="broadcast_threshold", help="Candidates with no resume passage at least this similar to the question are answered \"no relevant evidence\" without an AI call.")
+            with broadcast_cols[1]: st.slider("Passages per candidate", 1, 8, 4, key="broadcast_k")
+            question = st.session_state.broadcast_question.strip()
+            if st.button(f"Ask all {len(askable)} candidates", type="primary", use_container_width=True, disabled=not question):
+                rows = []
+                progress = st.progress(0.0, text="Searching every resume...")
+                for row in iter_broadcast_answers(
+                    st.session_state.saved_job_description,
+                    askable,
+                    question,
+                    st.session_state.llm,
+                    load_resume,
+                    k=st.session_state.broadcast_k,
+                    score_threshold=st.session_state.broadcast_threshold or None,
+                    max_workers=SCORING_MAX_WORKERS,
+                ):
+                    rows.append(row)
+                    progress.progress(len(rows) / len(askable), text=f"Answered {len(rows)} of {len(askable)} candidates...")
+                progress.empty()
+                st.session_state.broadcast = {"question": question, "rows": rows}
+            broadcast = st.session_state.get("broadcast")
+            if broadcast:
+                answered = sum(row['answered'] for row in broadcast['rows'])
+                st.caption(f"“{broadcast['question']}”: {answered} of {len(broadcast['rows'])} candidates had relevant passages; the rest were skipped without an AI call. Click a column header to sort.")
+                st.dataframe(
+                    [
+                        {
+                            "Candidate": row['name'],
+                            "Score": row['overall_score'],
+                            "Relevance": round(row['relevance'], 3),
+                            "Answer": row['answer'],
+                            "Citations": "\n\n".join(f"[{citation['relevance']:.2f}] {citation['text']}" for citation in row['citations']),
+                        }
+                        for row in sorted(broadcast['rows'], key=lambda row: (row['answered'], row['relevance']), reverse=True)
+                    ],
+                    column_config={"Relevance": st.column_config.ProgressColumn("Relevance", min_value=0.0, max_value=1.0, format="%.2f")},
+                    use_container_width=True,
+                    hide_index=True,
+                )
+        else:
+            st.info("No analysed candidates to ask yet.")
+
 st.markdown('</div>', unsafe_allow_html=True)
+
+if "startup_recorded" not in st.session_state:
+    st.session_state.startup_recorded = True
+    startup_seconds = time.perf_counter() - SCRIPT_STARTED
+    cold_start = get_process_start() == SCRIPT_STARTED
+    REGISTRY.observe("startup_seconds", startup_seconds, stage="cold_start" if cold_start else "session_start")
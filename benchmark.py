@@ -0,0 +1,340 @@
+"""Offline benchmark for the RecruitX pipeline.
+
+Runs every stage against a local stand-in chat model and synthetic PDF resumes, so pipeline changes can be
+measured without spending Groq quota:
+
+    python benchmark.py --sizes 10 100 1000 --latency 0.2 --malformed-rate 0.05 --output benchmark_results.json
+
+Results are written as JSON; compare two runs to spot regressions between commits.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+# Keep the benchmark's PDF text and index caches away from the app's, and start every run cold. The directory is
+# removed when main() returns, and in any case when the process exits.
+DATA_DIR = tempfile.TemporaryDirectory(prefix="recruitx-bench-")
+os.environ["RECRUITX_DATA_DIR"] = DATA_DIR.name
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import PrivateAttr
+
+import utils
+from metrics import REGISTRY, summarize
+from utils import (
+    InterviewQuestions,
+    KeyRequirements,
+    RateLimiter,
+    ask_rag_question,
+    create_candidate_rag_retriever,
+    extract_pdf_text,
+    find_duplicate_resumes,
+    generate_email_templates,
+    iter_extracted_resumes,
+    repair_json_locally,
+    score_candidates_concurrently,
+)
+
+SKILLS = [
+    "Python", "Kubernetes", "AWS", "PostgreSQL", "React", "TypeScript", "Terraform", "Kafka", "Spark", "Docker",
+    "Go", "Java", "GraphQL", "Airflow", "PyTorch", "CI/CD", "Redis", "Snowflake", "Rust", "Linux",
+]
+FIRST_NAMES = ["Ada", "Grace", "Alan", "Linus", "Margaret", "Dennis", "Barbara", "Ken", "Radia", "Guido"]
+LAST_NAMES = ["Lovelace", "Hopper", "Turing", "Torvalds", "Hamilton", "Ritchie", "Liskov", "Thompson", "Perlman", "Rossum"]
+
+JOB_DESCRIPTION = """Senior Backend Engineer
+We are looking for an engineer with 5+ years of Python experience, production Kubernetes and AWS operations,
+strong PostgreSQL skills, event streaming with Kafka, infrastructure as code with Terraform and experience
+mentoring other engineers."""
+REQUIREMENTS = ["5+ years of Python", "Production Kubernetes", "AWS operations", "PostgreSQL", "Kafka", "Terraform"]
+
+class FakeChatModel(BaseChatModel):
+    """Stand-in chat model with configurable latency and injected failures: errors, malformed JSON and 429s."""
+    latency: float = 0.05
+    error_rate: float = 0.0
+    malformed_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    seed: Optional[int] = None
+    model_name: str = "fake-recruitx"
+    temperature: float = 0.0
+    _rng: random.Random = PrivateAttr(default_factory=random.Random)
+
+    def model_post_init(self, __context: Any):
+        self._rng.seed(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-recruitx"
+
+    def _maybe_fail(self):
+        time.sleep(self.latency)
+        draw = self._rng.random()
+        if draw < self.rate_limit_rate:
+            raise Exception("Error code: 429 - {'error': {'message': 'Rate limit reached', 'code': 'rate_limit_exceeded'}}")
+        if draw < self.rate_limit_rate + self.error_rate:
+            raise RuntimeError("Injected fake LLM failure.")
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        self._maybe_fail()
+        prompt = "\n".join(str(message.content) for message in messages)
+        text = self._respond(prompt)
+        if text.lstrip().startswith(("{", "[")) and self._rng.random() < self.malformed_rate:
+            text = self._malform(text)
+        usage = {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4, "total_tokens": (len(prompt) + len(text)) // 4}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        text = self._generate(messages, stop, run_manager, **kwargs).generations[0].message.content
+        for word in re.split(r"(?<=\s)", text):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+    def with_structured_output(self, schema, **kwargs):
+        def respond(prompt_value):
+            self._maybe_fail()
+            if schema is KeyRequirements:
+                return KeyRequirements(key_requirements=REQUIREMENTS)
+            if schema is InterviewQuestions:
+                return InterviewQuestions(**json.loads(self._questions()))
+            raise ValueError(f"FakeChatModel has no structured response for {getattr(schema, '__name__', schema)}; supported schemas: KeyRequirements, InterviewQuestions.")
+        return RunnableLambda(respond)
+
+    def _malform(self, text: str) -> str:
+        if self._rng.random() < 0.5:
+            return "```json\n" + text[: max(1, int(len(text) * self._rng.uniform(0.6, 0.95)))]
+        return "Here is the JSON you asked for:\n" + text.replace("}", ",}", 1)
+
+    def _respond(self, prompt: str) -> str:
+        if "=== RESUME " in prompt:
+            return self._score_packed(prompt)
+        if "requirement_analysis" in prompt:
+            return self._score(prompt)
+        if '"behavioral"' in prompt:
+            return self._questions()
+        if "Broken JSON" in prompt:
+            return json.dumps(repair_json_locally(prompt.split("Broken JSON:", 1)[1]) or {})
+        if "Answer the question" in prompt:
+            return "Based on the resume, the candidate has relevant experience with " + ", ".join(s for s in SKILLS if s in prompt)[:200] + "."
+        if "email" in prompt:
+            return "Dear [CANDIDATE_NAME],\n\nThank you for your interest in the role. " + "We appreciate your time. " * 5 + "\n\nBest regards,\nHR"
+        return "OK"
+
+    def _requirements(self, prompt: str) -> List[str]:
+        requirements_match = re.search(r"REQUIREMENTS:\s*(\[.*?\])\s*2\. JOB DESCRIPTION", prompt, re.S)
+        return json.loads(requirements_match.group(1)) if requirements_match else REQUIREMENTS
+
+    def _score(self, prompt: str) -> str:
+        return json.dumps(self._assess(self._requirements(prompt), prompt.split("RESUME TEXT", 1)[-1]))
+
+    def _score_packed(self, prompt: str) -> str:
+        """One entry per "=== RESUME n ===" block; with malformed_rate, single entries lose a required field."""
+        requirements = self._requirements(prompt)
+        parts = re.split(r"=== RESUME (\d+) ===", prompt.split("3. RESUMES:", 1)[-1])[1:]
+        entries = []
+        for resume_id, resume in zip(parts[::2], parts[1::2]):
+            entry = {"resume_id": int(resume_id), **self._assess(requirements, resume)}
+            if self._rng.random() < self.malformed_rate:
+                del entry["requirement_analysis"]
+            entries.append(entry)
+        return json.dumps(entries)
+
+    def _assess(self, requirements: List[str], resume: str) -> Dict:
+        name_match = re.search(r"Name: ([A-Za-z]+ [A-Za-z]+)", resume)
+        analysis = []
+        for requirement in requirements:
+            keyword = next((s for s in SKILLS if s.lower() in requirement.lower()), requirement.split()[0])
+            found = keyword.lower() in resume.lower()
+            evidence = f"Worked extensively with {keyword}." if found else "No direct evidence found in the resume."
+            analysis.append({"requirement": requirement, "match_status": found, "evidence": evidence})
+        return {
+            "name": name_match.group(1) if name_match else "Unknown Candidate",
+            "summary": "Synthetic candidate. Strong on some requirements, with gaps on others.",
+            "requirement_analysis": analysis,
+        }
+
+    def _questions(self) -> str:
+        return json.dumps({
+            "behavioral": ["Tell me about a difficult project.", "How do you handle disagreement?", "Describe a failure."],
+            "technical": ["How would you scale a queue consumer?", "Explain database indexing."],
+        })
+
+def make_synthetic_resume(i: int, rng: random.Random, sections: int) -> List[str]:
+    """Returns the lines of a synthetic resume; `sections` controls its length."""
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    skills = rng.sample(SKILLS, rng.randint(3, 10))
+    lines = [f"Name: {name}", f"Email: candidate{i}@example.com", "", "SUMMARY",
+             f"Engineer with {rng.randint(1, 15)} years of experience in {', '.join(skills[:3])}.", "", "SKILLS", ", ".join(skills), "", "EXPERIENCE"]
+    for section in range(sections):
+        skill = rng.choice(skills)
+        lines += [
+            f"Software Engineer, Company {rng.randint(1, 500)} ({2024 - 2 * section - 2} - {2024 - 2 * section})",
+            f"- Built and operated services using {skill} for {rng.randint(2, 90)} million users.",
+            f"- Led a team of {rng.randint(2, 12)} engineers delivering {rng.choice(skills)} migrations.",
+            f"- Reduced latency by {rng.randint(10, 80)}% through profiling and caching.",
+            "",
+        ]
+    return lines
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("latin-1", "replace").decode("latin-1")
+
+def write_pdf(path: str, lines: List[str], lines_per_page: int = 50):
+    """Writes a minimal multi-page text PDF (Helvetica) that PyPDF2 can extract."""
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page_lines in pages:
+        stream = "BT /F1 10 Tf 14 TL 50 780 Td " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in page_lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R /Resources << /Font << /F1 3 0 R >> >> >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    out, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+
+def generate_corpus(directory: str, count: int, seed: int) -> List[str]:
+    """Writes `count` synthetic resumes of varied length (1 to roughly 4 pages) and returns their paths."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"resume_{i:05d}.pdf")
+        write_pdf(path, make_synthetic_resume(i, rng, sections=rng.choice([1, 2, 4, 8, 16, 32])))
+        paths.append(path)
+    return paths
+
+def timed(stage: str, candidates: int, items: int, fn) -> Dict:
+    before = REGISTRY.snapshot()
+    start = time.perf_counter()
+    value = fn()
+    seconds = time.perf_counter() - start
+    metrics = summarize(before, REGISTRY.snapshot())
+    print(f"{stage:>30} n={candidates:<5} {seconds:8.2f}s  ({1000 * seconds / max(items, 1):.1f} ms/item)")
+    return {"stage": stage, "candidates": candidates, "items": items, "seconds": round(seconds, 4), "ms_per_item": round(1000 * seconds / max(items, 1), 3), "metrics": metrics, "value": value}
+
+def run_size(size: int, paths: List[str], llm: FakeChatModel, args) -> List[Dict]:
+    weighted_requirements = {req: {"importance": "Important", "knockout": False} for req in REQUIREMENTS}
+    results = []
+
+    def extract_sequential():
+        texts = []
+        for path in paths:
+            with open(path, "rb") as f:
+                texts.append(extract_pdf_text(f))
+        return texts
+
+    stage = timed("extract_pdf_text", size, size, extract_sequential)
+    stage.pop("value")
+    results.append(stage)
+
+    def extract_parallel():
+        shutil.rmtree(utils.PDF_TEXT_CACHE_DIR, ignore_errors=True)
+        files = [open(path, "rb") for path in paths]
+        try:
+            return list(iter_extracted_resumes(files))
+        finally:
+            for f in files:
+                f.close()
+
+    stage = timed("iter_extracted_resumes", size, size, extract_parallel)
+    resumes = sorted(({**resume, "filename": os.path.basename(resume["filename"])} for resume in stage.pop("value") if not resume.get("extraction_error")), key=lambda resume: resume["filename"])
+    results.append(stage)
+
+    stage = timed("find_duplicate_resumes", size, len(resumes), lambda: find_duplicate_resumes(resumes))
+    stage["duplicates"] = len(stage.pop("value")[1])
+    results.append(stage)
+
+    rate_limiter = RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm) if args.rpm else None
+    stage = timed("score_candidate_explainable", size, len(resumes), lambda: score_candidates_concurrently(
+        JOB_DESCRIPTION, resumes, weighted_requirements, llm, max_workers=args.workers, rate_limiter=rate_limiter,
+        evidence_token_budget=None if args.skip_embeddings else utils.EVIDENCE_TOKEN_BUDGET))
+    candidates = stage.pop("value")
+    stage["errors"] = sum("Error:" in c["name"] for c in candidates)
+    results.append(stage)
+
+    stage = timed("score_candidates_packed", size, len(resumes), lambda: score_candidates_concurrently(
+        JOB_DESCRIPTION, resumes, weighted_requirements, llm, max_workers=args.workers, rate_limiter=rate_limiter,
+        evidence_token_budget=None if args.skip_embeddings else utils.EVIDENCE_TOKEN_BUDGET, packed=True))
+    stage["errors"] = sum("Error:" in c["name"] for c in stage.pop("value"))
+    results.append(stage)
+
+    if not args.skip_embeddings:
+        rag_sample = resumes[:min(len(resumes), args.rag_candidates)]
+        stage = timed("create_candidate_rag_retriever", size, len(rag_sample), lambda: [create_candidate_rag_retriever(r["text"], r["filename"]) for r in rag_sample])
+        retrievers = stage.pop("value")
+        results.append(stage)
+
+        stage = timed("ask_rag_question", size, len(retrievers), lambda: [ask_rag_question(retriever, "Does this candidate know Kubernetes?", llm) for retriever in retrievers])
+        stage.pop("value")
+        results.append(stage)
+
+    valid = [c for c in candidates if "Error:" not in c["name"]]
+    stage = timed("generate_email_templates", size, len(valid), lambda: generate_email_templates(
+        valid, {"title": "Senior Backend Engineer"}, 3, 50, "Monday at 10:00 AM", llm, max_workers=args.workers, rate_limiter=rate_limiter))
+    stage.pop("value")
+    results.append(stage)
+    return results
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the RecruitX pipeline offline with a fake LLM and synthetic resumes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Candidate pool sizes to run.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake LLM latency per call, in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of calls answered with an injected 429.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rpm", type=int, default=0, help="Apply a RateLimiter with this requests-per-minute quota (0 = none).")
+    parser.add_argument("--tpm", type=int, default=10_000_000)
+    parser.add_argument("--rag-candidates", type=int, default=20, help="Candidates per size used for the RAG stages.")
+    parser.add_argument("--skip-embeddings", action="store_true", help="Skip the stages that need the FastEmbed model.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args(argv)
+
+    llm = FakeChatModel(latency=args.latency, error_rate=args.error_rate, malformed_rate=args.malformed_rate, rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+    try:
+        all_paths = generate_corpus(os.path.join(DATA_DIR.name, "corpus"), max(args.sizes), args.seed)
+        results = []
+        for size in args.sizes:
+            results += run_size(size, all_paths[:size], llm, args)
+    finally:
+        DATA_DIR.cleanup()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
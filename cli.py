@@ -0,0 +1,153 @@
+"""Headless batch scoring for large resume pools.
+
+    python cli.py --jd job.txt --resumes "resumes/*.pdf" --output results.jsonl
+
+Each candidate is appended to the output as one JSON line as soon as it is scored. Re-running the same command
+after an interruption skips every file already scored successfully, and every PDF that had no readable text.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+from typing import Dict, List, Set
+
+from dotenv import load_dotenv
+
+from metrics import REGISTRY
+from utils import (
+    extract_key_requirements,
+    iter_extracted_resumes,
+    iter_scored_candidates,
+    RateLimiter,
+    LLMCache,
+    configure_llm_cache,
+    build_model_router,
+    MODEL_TIERS,
+    MODEL_TIMEOUT_SECONDS,
+)
+
+def collect_resume_paths(spec: str) -> List[str]:
+    """Expands a directory (all PDFs inside, recursively) or a glob pattern into a sorted list of PDF paths."""
+    if os.path.isdir(spec):
+        spec = os.path.join(spec, "**", "*.pdf")
+    return sorted(path for path in glob.glob(spec, recursive=True) if path.lower().endswith(".pdf"))
+
+def load_completed(output_path: str) -> Dict[str, Dict]:
+    """Reads the results written so far, keeping the latest successful result per file.
+
+    Unreadable PDFs count as done too: extracting them again would fail the same way. Scoring errors are retried.
+    """
+    completed = {}
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by a crash; that file is simply scored again
+            if "Error:" not in result.get("name", "Error:") or result.get("extraction_error"):
+                completed[result["filename"]] = result
+    return completed
+
+def load_or_create_checkpoint(checkpoint_path: str, job_description: str, weights_path: str, llm) -> Dict:
+    """Returns the run's weighted requirements, reusing the checkpoint of an interrupted run of the same JD."""
+    jd_hash = hashlib.sha256(job_description.encode("utf-8")).hexdigest()
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint["job_description_sha256"] != jd_hash:
+            raise SystemExit(f"{checkpoint_path} belongs to a different job description. Use a new --output or pass --restart.")
+        return checkpoint["weighted_requirements"]
+
+    if weights_path:
+        with open(weights_path, encoding="utf-8") as f:
+            weighted_requirements = json.load(f)
+    else:
+        print("Extracting key requirements from the job description...")
+        weighted_requirements = {req: {"importance": "Important", "knockout": False} for req in extract_key_requirements(job_description, llm)}
+    with open(checkpoint_path, "w", encoding="utf-8") as f:
+        json.dump({"job_description_sha256": jd_hash, "weighted_requirements": weighted_requirements}, f, indent=2)
+    return weighted_requirements
+
+def iter_pending_files(paths: List[str], completed_files: Set[str]):
+    """Opens each not-yet-scored PDF only when the extractor asks for it."""
+    for path in paths:
+        if path in completed_files:
+            continue
+        with open(path, "rb") as f:
+            yield f
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a batch of PDF resumes against a job description.")
+    parser.add_argument("--jd", required=True, help="Path to a text file with the job description.")
+    parser.add_argument("--resumes", required=True, help="Directory of PDFs or a glob pattern such as 'resumes/*.pdf'.")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file that receives one line per candidate.")
+    parser.add_argument("--weights", help="Optional JSON file mapping requirement -> {\"importance\": ..., \"knockout\": ...}.")
+    parser.add_argument("--model", default=MODEL_TIERS["large"], help="Model for scoring and requirement extraction.")
+    parser.add_argument("--small-model", default=MODEL_TIERS["small"], help="Fallback model when --model is throttled.")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent scoring requests.")
+    parser.add_argument("--rpm", type=int, default=int(os.environ.get("GROQ_REQUESTS_PER_MINUTE", 30)), help="Requests-per-minute quota of each model.")
+    parser.add_argument("--tpm", type=int, default=int(os.environ.get("GROQ_TOKENS_PER_MINUTE", 6000)), help="Tokens-per-minute quota of each model.")
+    parser.add_argument("--packed", action="store_true", help="Score several short resumes per request (fewer requests and tokens).")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the on-disk LLM response cache.")
+    parser.add_argument("--metrics", help="Write run metrics here at the end: Prometheus text for *.prom, JSON otherwise.")
+    parser.add_argument("--restart", action="store_true", help="Discard previous output and checkpoint and start over.")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    if "GROQ_API_KEY" not in os.environ:
+        raise SystemExit("GROQ_API_KEY is not set.")
+    from langchain_groq import ChatGroq
+    llm = build_model_router(
+        lambda model: ChatGroq(model=model, temperature=0.1, api_key=os.environ["GROQ_API_KEY"], timeout=MODEL_TIMEOUT_SECONDS, max_retries=0),
+        {"large": args.model, "small": args.small_model},
+        make_rate_limiter=lambda model: RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm),
+    )
+    if not args.no_cache:
+        configure_llm_cache(LLMCache())
+
+    checkpoint_path = args.output + ".checkpoint.json"
+    if args.restart:
+        for path in (args.output, checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    with open(args.jd, encoding="utf-8") as f:
+        job_description = f.read()
+    weighted_requirements = load_or_create_checkpoint(checkpoint_path, job_description, args.weights, llm)
+
+    paths = collect_resume_paths(args.resumes)
+    completed = load_completed(args.output)
+    completed_hashes = {r["file_hash"] for r in completed.values() if r.get("file_hash") and not r.get("extraction_error")}
+    print(f"{len(paths)} resumes found, {sum(p in completed for p in paths)} already processed.")
+
+    def pending_resumes():
+        for resume in iter_extracted_resumes(iter_pending_files(paths, set(completed))):
+            if resume["file_hash"] in completed_hashes:
+                print(f"Skipping {resume['filename']}: identical file already scored.")
+                continue
+            yield resume
+
+    scored, failed = 0, 0
+    with open(args.output, "a", encoding="utf-8") as out:
+        for result in iter_scored_candidates(job_description, pending_resumes(), weighted_requirements, llm, max_workers=args.workers, packed=args.packed):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+            if "Error:" in result["name"]:
+                failed += 1
+            else:
+                scored += 1
+            print(f"[{scored + failed}] {result['filename']}: {result['overall_score']}{' (knocked out)' if result.get('knocked_out') else ''}")
+
+    print(f"Done. {scored} scored, {failed} failed. Results in {args.output}.")
+    if args.metrics:
+        REGISTRY.write(args.metrics)
+        print(f"Metrics written to {args.metrics}.")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""In-process pipeline metrics: counters and latency histograms, exportable as Prometheus text or JSON."""
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(key) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def quantile(self, q: float, counts: Optional[list] = None) -> float:
+        """Estimates a quantile as the upper bound of the bucket that contains it.
+
+        Values above the last bucket report that bucket's bound (as Prometheus does), which keeps the result finite
+        and JSON-safe; a quantile equal to the last bound therefore means "at least this".
+        """
+        counts = counts or self.counts
+        total = sum(counts)
+        if not total:
+            return 0.0
+        running = 0
+        for i, count in enumerate(counts):
+            running += count
+            if running >= q * total:
+                break
+        return self.buckets[min(i, len(self.buckets) - 1)]
+
+class MetricsRegistry:
+    """Thread-safe store of counters and histograms keyed by metric name and labels."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._local = threading.local()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+        for run in getattr(self._local, "runs", ()):
+            run.inc(name, value, **labels)
+
+    def observe(self, name: str, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._histograms.setdefault(name, {}).setdefault(key, Histogram()).observe(value)
+        for run in getattr(self._local, "runs", ()):
+            run.observe(name, value, **labels)
+
+    @contextmanager
+    def recording_to(self, run: "MetricsRegistry"):
+        """Also records everything this thread reports during the block into `run`.
+
+        Gives one run its own metrics while other sessions keep reporting into the same process-wide registry;
+        work handed to other threads must enter the block there too.
+        """
+        previous = getattr(self._local, "runs", ())
+        self._local.runs = previous + (run,)
+        try:
+            yield
+        finally:
+            self._local.runs = previous
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observes the wall time of the block, in seconds, even when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name: str, **labels):
+        """Decorator form of `timer` for whole functions."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> Dict:
+        """A JSON-serialisable copy of every series."""
+        with self._lock:
+            return {
+                "counters": {name: [{"labels": dict(key), "value": value} for key, value in series.items()] for name, series in self._counters.items()},
+                "histograms": {
+                    name: [{"labels": dict(key), "count": h.count, "sum": h.sum, "buckets": list(h.buckets), "counts": list(h.counts)} for key, h in series.items()]
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def to_json(self) -> str:
+        return json.dumps({"timestamp": time.time(), **self.snapshot()}, indent=2)
+
+    def to_prometheus(self, prefix: str = "recruitx_") -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {prefix}{name} counter")
+                for key, value in series.items():
+                    lines.append(f"{prefix}{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                for key, h in series.items():
+                    running = 0
+                    for bound, count in zip(h.buckets, h.counts):
+                        running += count
+                        lines.append(f"{prefix}{name}_bucket{_format_labels(key, {'le': str(bound)})} {running}")
+                    lines.append(f"{prefix}{name}_bucket{_format_labels(key, {'le': '+Inf'})} {h.count}")
+                    lines.append(f"{prefix}{name}_sum{_format_labels(key)} {h.sum}")
+                    lines.append(f"{prefix}{name}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict:
+        """summarize() over everything recorded so far."""
+        return summarize({}, self.snapshot())
+
+    def write(self, path: str):
+        """Writes the metrics to `path`: Prometheus text for *.prom / *.txt, JSON otherwise."""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json())
+
+def summarize(before: Dict, after: Dict) -> Dict:
+    """Summarises what happened between two snapshots (one run): per-series counts, totals and p50/p95 latencies."""
+    def index(entries):
+        return {_label_key(entry["labels"]): entry for entry in entries}
+
+    summary = {"counters": {}, "histograms": {}}
+    for name, entries in after["counters"].items():
+        previous = index(before.get("counters", {}).get(name, []))
+        for key, entry in index(entries).items():
+            delta = entry["value"] - previous.get(key, {}).get("value", 0)
+            if delta:
+                summary["counters"][f"{name}{_format_labels(key)}"] = delta
+    for name, entries in after["histograms"].items():
+        previous = index(before.get("histograms", {}).get(name, []))
+        for key, entry in index(entries).items():
+            prior = previous.get(key)
+            counts = [c - (prior["counts"][i] if prior else 0) for i, c in enumerate(entry["counts"])]
+            count = entry["count"] - (prior["count"] if prior else 0)
+            if not count:
+                continue
+            total = entry["sum"] - (prior["sum"] if prior else 0)
+            histogram = Histogram(tuple(entry["buckets"]))
+            summary["histograms"][f"{name}{_format_labels(key)}"] = {
+                "count": count,
+                "total_seconds": round(total, 3),
+                "mean_seconds": round(total / count, 3),
+                "p50_seconds": histogram.quantile(0.5, counts),
+                "p95_seconds": histogram.quantile(0.95, counts),
+            }
+    return summary
+
+REGISTRY = MetricsRegistry()
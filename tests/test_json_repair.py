@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from utils import CandidateAssessment, InterviewQuestions, parse_llm_json, repair_json_locally, validate_assessment
+
+REQUIREMENTS = ["PostgreSQL", "Kubernetes"]
+
+COMPLETE = json.dumps({
+    "name": "Jane Doe",
+    "summary": "Backend engineer.",
+    "requirement_analysis": [
+        {"requirement": "PostgreSQL", "match_status": True, "evidence": "Ran PostgreSQL clusters at Acme."},
+        {"requirement": "Kubernetes", "match_status": False, "evidence": "No direct evidence found in the resume."},
+    ],
+})
+
+class RepairModel:
+    """Stands in for the LLM used by repair_and_parse_json; always answers with `reply`."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = 0
+
+def _validate(data):
+    return validate_assessment(data, REQUIREMENTS)
+
+@pytest.fixture
+def repair_model(monkeypatch):
+    model = RepairModel(COMPLETE)
+
+    def fake_call_llm(llm, prompt, input_data, response_model=None, task=None):
+        llm.calls += 1
+        return llm.reply
+
+    monkeypatch.setattr("utils.call_llm", fake_call_llm)
+    return model
+
+@pytest.mark.parametrize("marker, expected_first_match", [
+    ('"match_st', {"requirement": "PostgreSQL"}),
+    ('"match_status": ', {"requirement": "PostgreSQL"}),
+    ('"match_status": tr', {"requirement": "PostgreSQL"}),
+    ('"evidence": "Ran Postgre', {"requirement": "PostgreSQL", "match_status": True}),
+])
+def test_truncated_fields_are_dropped_not_filled(marker, expected_first_match):
+    truncated = COMPLETE[:COMPLETE.index(marker.split(":")[0]) + len(marker)]
+    repaired = repair_json_locally(truncated)
+    assert repaired["requirement_analysis"] == [expected_first_match]
+
+def test_truncated_string_value_is_not_closed():
+    repaired = repair_json_locally('{"name": "Jane Doe", "summary": "Backend eng')
+    assert repaired == {"name": "Jane Doe"}
+
+def test_key_without_value_is_dropped():
+    assert repair_json_locally('{"name": "Jane Doe", "summary":') == {"name": "Jane Doe"}
+
+def test_complete_elements_before_the_cut_are_kept():
+    assert repair_json_locally('{"technical": ["What is MVCC?", "Explain WAL"], "behavioral": ["Tell me') == {"technical": ["What is MVCC?", "Explain WAL"], "behavioral": []}
+
+def test_truncated_response_fails_validation_locally():
+    truncated = COMPLETE[:COMPLETE.index('"match_status": true') + 5]
+    assert repair_json_locally(truncated) is not None
+    assert repair_json_locally(truncated, _validate) is None
+
+def test_truncated_response_falls_back_to_llm_repair(repair_model):
+    truncated = COMPLETE[:COMPLETE.index('{"requirement": "Kubernetes"') + 20]
+    parsed = parse_llm_json(truncated, repair_model, validate=_validate)
+    assert repair_model.calls == 1
+    assert CandidateAssessment(**parsed).requirement_analysis[1].requirement == "Kubernetes"
+
+def test_llm_repair_result_must_validate(repair_model):
+    repair_model.reply = '{"name": "Jane Doe"}'
+    with pytest.raises(ValueError):
+        parse_llm_json(COMPLETE[:60], repair_model, validate=_validate)
+
+def test_syntax_fault_is_still_repaired_locally(repair_model):
+    broken = COMPLETE.replace("Ran PostgreSQL", "Ran\nPostgreSQL").replace("}]", "},]")
+    parsed = parse_llm_json(broken, repair_model, validate=_validate)
+    assert repair_model.calls == 0
+    assert parsed["requirement_analysis"][0]["evidence"] == "Ran\nPostgreSQL clusters at Acme."
+
+def test_truncated_packed_response_keeps_only_complete_entries(repair_model):
+    entries = [{"resume_id": i, **json.loads(COMPLETE)} for i in (1, 2)]
+    text = json.dumps(entries)
+    truncated = text[:text.rindex('"requirement": "Kubernetes"')]
+    validate = lambda data: [_validate(entry) for entry in data]
+    parsed = parse_llm_json(truncated, repair_model, validate=validate)
+    assert repair_model.calls == 0
+    assert [entry["resume_id"] for entry in parsed] == [1]
+
+def test_interview_questions_validator():
+    parsed = repair_json_locally('{"behavioral": ["Tell me about a conflict."], "technical": ["Expl', lambda data: InterviewQuestions(**data))
+    assert parsed == {"behavioral": ["Tell me about a conflict."], "technical": []}
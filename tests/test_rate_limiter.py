@@ -0,0 +1,84 @@
+import time
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from utils import LLMCache, RateLimiter, call_llm, call_with_rate_limit_retry, configure_llm_cache
+
+NO_WAIT = 0.05  # acquire() sleeps at least this long whenever it has to wait
+
+class CountingRateLimiter(RateLimiter):
+    """A RateLimiter that remembers how often it was acquired."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.acquired = 0
+
+    def acquire(self, tokens=0):
+        self.acquired += 1
+        return super().acquire(tokens)
+
+@pytest.fixture
+def llm_cache(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite"))
+    configure_llm_cache(cache)
+    yield cache
+    configure_llm_cache(None)
+
+def _elapse(limiter, seconds):
+    limiter._last_refill -= seconds
+
+def test_request_bucket_refills_over_time():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=0)
+    for _ in range(60):
+        assert limiter.acquire() < NO_WAIT
+    assert limiter._request_allowance < 1
+    _elapse(limiter, 1)
+    assert limiter.acquire() < NO_WAIT
+
+def test_token_bucket_refills_over_time():
+    limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=600)
+    assert limiter.acquire(600) < NO_WAIT
+    _elapse(limiter, 30)
+    assert limiter.acquire(300) < NO_WAIT
+    assert limiter._token_allowance < 1
+
+def test_refill_is_capped_at_one_minute_of_quota():
+    limiter = RateLimiter(requests_per_minute=10, tokens_per_minute=1000)
+    _elapse(limiter, 3600)
+    limiter._refill(time.monotonic())
+    assert limiter._request_allowance == 10
+    assert limiter._token_allowance == 1000
+
+def test_zero_means_unlimited():
+    limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=0)
+    start = time.monotonic()
+    for _ in range(1000):
+        assert limiter.acquire(10000) < NO_WAIT
+    assert time.monotonic() - start < 1
+
+def test_negative_limits_are_rejected():
+    with pytest.raises(ValueError):
+        RateLimiter(requests_per_minute=-1)
+
+def test_pause_holds_back_acquire():
+    limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=0)
+    limiter.pause(0.2)
+    assert limiter.acquire() >= 0.2
+    assert limiter.acquire() < NO_WAIT
+
+def test_pause_never_shortens_an_earlier_pause():
+    limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=0)
+    limiter.pause(0.3)
+    limiter.pause(0.05)
+    assert limiter.acquire() >= 0.3
+
+def test_cache_hit_does_not_acquire(llm_cache):
+    model = FakeListChatModel(responses=["first answer", "second answer"])
+    limiter = CountingRateLimiter(requests_per_minute=60, tokens_per_minute=6000)
+    ask = lambda: call_llm(model, "Say something about {topic}.", {"topic": "limits"}).content
+
+    assert call_with_rate_limit_retry(ask, rate_limiter=limiter, estimated_tokens=50) == "first answer"
+    assert limiter.acquired == 1
+    assert call_with_rate_limit_retry(ask, rate_limiter=limiter, estimated_tokens=50) == "first answer"
+    assert limiter.acquired == 1
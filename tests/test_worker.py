@@ -0,0 +1,63 @@
+import threading
+import time
+
+from worker import AnalysisQueue
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_sessions_take_turns():
+    queue = AnalysisQueue(max_workers=1)
+    release = threading.Event()
+    order = []
+    blocker = queue.submit("blocker", ["hold"], lambda item: release.wait(5))
+    _wait_until(lambda: blocker._in_flight == 1)
+    first = queue.submit("first", ["a0", "a1", "a2"], order.append)
+    second = queue.submit("second", ["b0", "b1", "b2"], order.append)
+    _wait_until(lambda: first._ready and second._ready)
+    release.set()
+    _wait_until(lambda: first.finished and second.finished)
+    assert order == ["a0", "b0", "a1", "b1", "a2", "b2"]
+    assert first.status == second.status == "done"
+
+def test_cancel_while_producer_waits_on_full_buffer():
+    queue = AnalysisQueue(max_workers=1)
+    release = threading.Event()
+    closed = threading.Event()
+
+    def items():
+        try:
+            n = 0
+            while True:
+                yield n
+                n += 1
+        finally:
+            closed.set()
+
+    task = queue.submit("session", items(), lambda item: release.wait(5) and item)
+    _wait_until(lambda: task._in_flight == 1 and len(task._ready) == 1)
+    queue.cancel(task.task_id)
+    _wait_until(closed.is_set)
+    release.set()
+    _wait_until(lambda: task.finished)
+    assert task.status == "cancelled"
+    assert task.results == [0]
+
+def test_producer_exception_fails_task():
+    queue = AnalysisQueue(max_workers=2)
+    finished = []
+
+    def items():
+        yield 1
+        yield 2
+        raise OSError("disk went away")
+
+    task = queue.submit("session", items(), lambda item: item * 10, on_finish=finished.append)
+    _wait_until(lambda: task.finished)
+    assert task.status == "failed"
+    assert task.error == "disk went away"
+    assert sorted(task.results) == [10, 20]
+    assert finished == [task]
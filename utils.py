@@ -1,14 +1,35 @@
+import functools
+import hashlib
+import io
 import json
-from typing import List, Dict, Any, Optional
-import PyPDF2
+import multiprocessing
+import os
+import pickle
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Iterable, Iterator, Callable, Tuple
+import numpy as np
 from pydantic import BaseModel, Field
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import FastEmbedEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains import create_retrieval_chain
+from langchain_core.runnables import Runnable, RunnableLambda, RunnablePassthrough
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from metrics import REGISTRY
+
+# PDF parsing, text splitting, FAISS and FastEmbed are imported where they are used, so the upload and weighting
+# steps start without loading the embedding / vector stack. warm_up_in_background() preloads them once per process.
+if TYPE_CHECKING:
+    from langchain_community.embeddings import FastEmbedEmbeddings
+    from langchain_community.vectorstores import FAISS
 
 def clean_llm_output(text: str) -> str:
     """Cleans the raw text output from the LLM, removing markdown fences."""
@@ -21,50 +42,692 @@ def clean_llm_output(text: str) -> str:
         text = text[:-3]
     return text.strip()
 
-def call_llm(llm: BaseChatModel, prompt_template: str, input_data: Dict[str, Any], response_model: Optional[BaseModel] = None) -> Any:
-    """Invokes the LLM with structured output enforcement if a model is provided."""
+DATA_DIR = os.environ.get("RECRUITX_DATA_DIR", ".recruitx")
+
+class LLMCache:
+    """Disk-backed (SQLite) cache of LLM responses keyed on a hash of prompt, model, temperature and schema."""
+    def __init__(self, path: str = os.path.join(DATA_DIR, "llm_cache.sqlite"), ttl_seconds: Optional[float] = 7 * 24 * 3600, max_entries: int = 50000, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, payload TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, last_accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_accessed ON responses (last_accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(rendered_prompt: str, model_name: Optional[str], temperature: Optional[float], schema: Optional[Dict]) -> str:
+        material = json.dumps([rendered_prompt, model_name, temperature, schema], sort_keys=True, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT payload, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, payload: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, payload, size, created_at, last_accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload.encode("utf-8")), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        if self.ttl_seconds is not None:
+            self.evictions += self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+        count, total_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        while count > self.max_entries or total_bytes > self.max_bytes:
+            overflow = max(count - self.max_entries, 1)
+            rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_accessed LIMIT ?", (overflow,)).fetchall()
+            if not rows:
+                break
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", [(row[0],) for row in rows])
+            self.evictions += len(rows)
+            count -= len(rows)
+            total_bytes -= sum(row[1] for row in rows)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total_bytes,
+        }
+
+_llm_cache: Optional[LLMCache] = None
+
+def configure_llm_cache(cache: Optional[LLMCache]):
+    """Enables (or, with None, disables) the response cache used by call_llm."""
+    global _llm_cache
+    _llm_cache = cache
+
+def get_llm_cache() -> Optional[LLMCache]:
+    return _llm_cache
+
+def _llm_cache_key(llm: BaseChatModel, prompt: ChatPromptTemplate, input_data: Dict[str, Any], response_model: Optional[BaseModel]) -> str:
+    rendered_prompt = json.dumps([message.content for message in prompt.format_messages(**input_data)])
+    model_name = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+    schema = response_model.model_json_schema() if response_model else None
+    return LLMCache.make_key(rendered_prompt, model_name, getattr(llm, "temperature", None), schema)
+
+def invalidate_cached_response(llm: BaseChatModel, prompt_template: str, input_data: Dict[str, Any], response_model: Optional[BaseModel] = None):
+    """Drops a cached response, e.g. one that turned out to be unparseable, so the next call goes to the LLM."""
+    if _llm_cache:
+        for model in (llm.models.values() if isinstance(llm, ModelRouter) else [llm]):
+            _llm_cache.delete(_llm_cache_key(model, ChatPromptTemplate.from_template(prompt_template), input_data, response_model))
+
+def _model_name(llm: BaseChatModel) -> str:
+    return str(getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__)
+
+def _record_token_usage(message: Any, model_name: str):
+    """Counts input/output tokens from the provider's response metadata, when it reports them."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    input_tokens, output_tokens = usage.get("input_tokens"), usage.get("output_tokens")
+    if input_tokens is None:
+        token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+        input_tokens, output_tokens = token_usage.get("prompt_tokens"), token_usage.get("completion_tokens")
+    if input_tokens is not None:
+        REGISTRY.inc("llm_tokens_total", input_tokens, model=model_name, direction="input")
+    if output_tokens is not None:
+        REGISTRY.inc("llm_tokens_total", output_tokens, model=model_name, direction="output")
+
+def _invoke_counted(llm: BaseChatModel, prompt: ChatPromptTemplate, input_data: Dict[str, Any]) -> AIMessage:
+    """Invokes `prompt | llm` uncached, counting the call and its tokens like _invoke_model does."""
+    model_name = _model_name(llm)
+    try:
+        with REGISTRY.timer("llm_call_seconds", model=model_name):
+            message = (prompt | llm).invoke(input_data)
+    except Exception:
+        REGISTRY.inc("llm_calls_total", model=model_name, status="error")
+        raise
+    REGISTRY.inc("llm_calls_total", model=model_name, status="ok")
+    _record_token_usage(message, model_name)
+    return message
+
+def _stream_counted(llm: BaseChatModel, chunks: Iterator[AIMessageChunk]) -> Iterator[str]:
+    """Yields the text of `llm`'s streamed reply, counting the call and, from the chunks merged, its tokens.
+
+    Providers report usage on the last chunk only, so a reply abandoned part way through counts as a call without tokens.
+    """
+    model_name = _model_name(llm)
+    start = time.perf_counter()
+    message = None
+    try:
+        for chunk in chunks:
+            message = chunk if message is None else message + chunk
+            if chunk.content:
+                yield chunk.content
+    except Exception:
+        REGISTRY.inc("llm_calls_total", model=model_name, status="error")
+        raise
+    finally:
+        REGISTRY.observe("llm_call_seconds", time.perf_counter() - start, model=model_name)
+    REGISTRY.inc("llm_calls_total", model=model_name, status="ok")
+    if message is not None:
+        _record_token_usage(message, model_name)
+
+def call_llm(llm: BaseChatModel, prompt_template: str, input_data: Dict[str, Any], response_model: Optional[BaseModel] = None, use_cache: bool = True, task: Optional[str] = None) -> Any:
+    """Invokes the LLM with structured output enforcement if a model is provided, serving repeats from the response cache.
+
+    `llm` may be a ModelRouter, which picks the model for `task` and fails over to another when it is throttled.
+    """
+    return run_task(llm, task, lambda model: _invoke_model(model, prompt_template, input_data, response_model, use_cache), cached=True)
+
+def _invoke_model(llm: BaseChatModel, prompt_template: str, input_data: Dict[str, Any], response_model: Optional[BaseModel], use_cache: bool) -> Any:
+    model_name = _model_name(llm)
     try:
         chain = ChatPromptTemplate.from_template(prompt_template)
+        cache = _llm_cache if use_cache else None
+        cache_key = None
+        if cache:
+            cache_key = _llm_cache_key(llm, chain, input_data, response_model)
+            cached_payload = cache.get(cache_key)
+            REGISTRY.inc("llm_cache_requests_total", result="hit" if cached_payload is not None else "miss")
+            if cached_payload is not None:
+                return response_model.model_validate_json(cached_payload) if response_model else AIMessage(content=cached_payload)
+
+        acquire_rate_limits()
         if response_model:
-            structured_llm = llm.with_structured_output(response_model)
+            structured_llm = llm.with_structured_output(response_model, include_raw=True)
             chain = chain | structured_llm
         else:
             chain = chain | llm
         
-        response = chain.invoke(input_data)
+        try:
+            with REGISTRY.timer("llm_call_seconds", model=model_name):
+                response = chain.invoke(input_data)
+        except Exception:
+            REGISTRY.inc("llm_calls_total", model=model_name, status="error")
+            raise
+        REGISTRY.inc("llm_calls_total", model=model_name, status="ok")
+        raw_message = response
+        if response_model and isinstance(response, dict) and "parsed" in response:
+            raw_message = response.get("raw")
+            if response.get("parsing_error") or response.get("parsed") is None:
+                raise ValueError(f"Structured output could not be parsed: {response.get('parsing_error')}")
+            response = response["parsed"]
+        _record_token_usage(raw_message, model_name)
+
+        if cache and response is not None:
+            if response_model:
+                cache.set(cache_key, response.model_dump_json())
+            elif isinstance(getattr(response, "content", None), str):
+                cache.set(cache_key, response.content)
         return response
     except Exception as e:
-        raise Exception(f"LLM invocation failed: {e}")
+        raise Exception(f"LLM invocation failed: {e}") from e
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimates the token count of a text (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Checks whether an exception (or any exception it wraps) is an HTTP 429 rate-limit response."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if getattr(error, "status_code", None) == 429:
+            return True
+        message = str(error).lower()
+        if "429" in message or "rate limit" in message or "rate_limit" in message:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+def is_timeout_error(error: BaseException) -> bool:
+    """Checks whether an exception (or any exception it wraps) is a request timeout."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, TimeoutError) or "timed out" in str(error).lower() or "timeout" in type(error).__name__.lower():
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+MODEL_TIERS = {
+    "large": os.environ.get("RECRUITX_MODEL_LARGE", "llama3-70b-8192"),
+    "small": os.environ.get("RECRUITX_MODEL_SMALL", "llama3-8b-8192"),
+}
+TASK_TIERS = {
+    "extract_requirements": "large",
+    "score": "large",
+    "interview_questions": "small",
+    "email": "small",
+    "json_repair": "small",
+    "rag": "small",
+}
+TASK_TIERS.update(dict(item.split("=", 1) for item in os.environ.get("RECRUITX_TASK_TIERS", "").replace(" ", "").split(",") if "=" in item))
+MODEL_TIMEOUT_SECONDS = float(os.environ.get("RECRUITX_MODEL_TIMEOUT", 30))
+SLOW_CALL_SECONDS = float(os.environ.get("RECRUITX_SLOW_CALL_SECONDS", 20))
+MODEL_COOLDOWN_SECONDS = float(os.environ.get("RECRUITX_MODEL_COOLDOWN", 60))
+
+_answered_by = threading.local()
+
+def last_model_name() -> Optional[str]:
+    """The model that answered the last run_task() or ModelRouter call made on this thread."""
+    return getattr(_answered_by, "model", None)
+
+class ModelRouter:
+    """Sends each task type to its model tier and fails over to the other tiers when a model is throttled or slow.
+
+    A model that answers with a 429, times out, or takes longer than `slow_call_seconds` is moved to the back of
+    every task's order for `cooldown_seconds`. Each call's latency is recorded as task_seconds{task, model}.
+    Each tier may have its own RateLimiter (providers meter quotas per model), acquired only for the tier that is
+    actually called, with the tokens estimated by the enclosing call_with_rate_limit_retry().
+    """
+    def __init__(self, models: Dict[str, BaseChatModel], task_tiers: Optional[Dict[str, str]] = None, default_tier: Optional[str] = None, slow_call_seconds: float = SLOW_CALL_SECONDS, cooldown_seconds: float = MODEL_COOLDOWN_SECONDS, rate_limiters: Optional[Dict[str, "RateLimiter"]] = None):
+        self.models = models
+        self.rate_limiters = rate_limiters or {}
+        self.task_tiers = dict(TASK_TIERS if task_tiers is None else task_tiers)
+        self.default_tier = default_tier or next(iter(models))
+        self.slow_call_seconds = slow_call_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self._cooling: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def tier_order(self, task: Optional[str]) -> List[str]:
+        """The task's own tier first, then the others; tiers cooling down go last."""
+        primary = self.task_tiers.get(task, self.default_tier)
+        order = []
+        for tier in ([primary] if primary in self.models else []) + list(self.models):
+            if all(self.models[tier] is not self.models[seen] for seen in order):
+                order.append(tier)
+        now = time.monotonic()
+        with self._lock:
+            return sorted(order, key=lambda tier: self._cooling.get(tier, 0) > now)
 
-def repair_and_parse_json(llm: BaseChatModel, broken_json_string: str) -> Optional[Dict]:
-    """Attempts to repair a broken JSON string using an LLM."""
-    repair_prompt = f"""
+    def _cool_down(self, tier: str):
+        with self._lock:
+            self._cooling[tier] = time.monotonic() + self.cooldown_seconds
+
+    def _failover_reason(self, error: BaseException) -> Optional[str]:
+        return "rate_limit" if is_rate_limit_error(error) else "timeout" if is_timeout_error(error) else None
+
+    def _finished(self, task: Optional[str], tier: str, elapsed: float):
+        REGISTRY.observe("task_seconds", elapsed, task=task or "default", model=_model_name(self.models[tier]))
+        if elapsed > self.slow_call_seconds and len(self.models) > 1:
+            self._cool_down(tier)
+            REGISTRY.inc("model_failovers_total", task=task or "default", model=_model_name(self.models[tier]), reason="slow")
+
+    def _fail_over(self, task: Optional[str], tier: str, reason: str, next_tier: str):
+        self._cool_down(tier)
+        REGISTRY.inc("model_failovers_total", task=task or "default", model=_model_name(self.models[tier]), reason=reason)
+        print(f"{_model_name(self.models[tier])} failed for {task or 'default'} ({reason}); failing over to {_model_name(self.models[next_tier])}.")
+
+    def run(self, task: Optional[str], fn: Callable[[BaseChatModel], Any], cached: bool = False) -> Any:
+        """Returns `fn(model)` from the first model in the task's order that is not throttled or timing out."""
+        order = self.tier_order(task)
+        for position, tier in enumerate(order):
+            start, waited = time.perf_counter(), _rate_limit_seconds_waited()
+            try:
+                with defer_rate_limit(self.rate_limiters.get(tier), _deferred_tokens()):
+                    if not cached:
+                        acquire_rate_limits()
+                    result = fn(self.models[tier])
+            except Exception as e:
+                reason = self._failover_reason(e)
+                if reason is None or position == len(order) - 1:
+                    raise
+                self._fail_over(task, tier, reason, order[position + 1])
+                continue
+            # Time spent waiting for our own quota is not the model's latency; counting it would cool down a healthy model.
+            self._finished(task, tier, time.perf_counter() - start - (_rate_limit_seconds_waited() - waited))
+            _answered_by.model = _model_name(self.models[tier])
+            return result
+
+    def stream(self, task: Optional[str], fn: Callable[[BaseChatModel], Iterator[Any]]) -> Iterator[Any]:
+        """Streams `fn(model)`, failing over only while nothing has been yielded yet."""
+        order = self.tier_order(task)
+        for position, tier in enumerate(order):
+            started = False
+            try:
+                with defer_rate_limit(self.rate_limiters.get(tier), _deferred_tokens()):
+                    acquire_rate_limits()
+                start = time.perf_counter()
+                for chunk in fn(self.models[tier]):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                reason = self._failover_reason(e)
+                if started or reason is None or position == len(order) - 1:
+                    raise
+                self._fail_over(task, tier, reason, order[position + 1])
+                continue
+            self._finished(task, tier, time.perf_counter() - start)
+            _answered_by.model = _model_name(self.models[tier])
+            return
+
+def run_task(llm: Any, task: Optional[str], fn: Callable[[BaseChatModel], Any], cached: bool = False) -> Any:
+    """Runs `fn(model)` through the router's model for `task`, or on `llm` itself when it is a plain chat model.
+
+    Unless `cached` (fn goes through the response cache, which acquires on a miss), deferred rate limits are acquired first.
+    """
+    if isinstance(llm, ModelRouter):
+        return llm.run(task, fn, cached)
+    if not cached:
+        acquire_rate_limits()
+    result = fn(llm)
+    _answered_by.model = _model_name(llm)
+    return result
+
+def build_model_router(make_model: Callable[[str], BaseChatModel], tiers: Optional[Dict[str, str]] = None, make_rate_limiter: Optional[Callable[[str], "RateLimiter"]] = None) -> ModelRouter:
+    """Builds a router with one model per tier (tier -> model name, MODEL_TIERS by default), and one rate limiter per
+    model if `make_rate_limiter` is given. Tiers naming the same model share both."""
+    tiers = tiers or MODEL_TIERS
+    by_name: Dict[str, BaseChatModel] = {}
+    limiters_by_name: Dict[str, RateLimiter] = {}
+    models, rate_limiters = {}, {}
+    for tier, name in tiers.items():
+        if name not in by_name:
+            by_name[name] = make_model(name)
+            if make_rate_limiter:
+                limiters_by_name[name] = make_rate_limiter(name)
+        models[tier] = by_name[name]
+        if name in limiters_by_name:
+            rate_limiters[tier] = limiters_by_name[name]
+    return ModelRouter(models, default_tier="large" if "large" in models else None, rate_limiters=rate_limiters)
+
+class RateLimiter:
+    """Thread-safe token bucket enforcing both a requests-per-minute and a tokens-per-minute quota; 0 means unlimited."""
+    def __init__(self, requests_per_minute: int = 30, tokens_per_minute: int = 6000):
+        if requests_per_minute < 0 or tokens_per_minute < 0:
+            raise ValueError(f"Rate limits must be 0 (unlimited) or positive, got {requests_per_minute} rpm / {tokens_per_minute} tpm.")
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_allowance = float(requests_per_minute)
+        self._token_allowance = float(tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._request_allowance = min(self.requests_per_minute, self._request_allowance + elapsed * self.requests_per_minute / 60)
+        self._token_allowance = min(self.tokens_per_minute, self._token_allowance + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Blocks until one request of `tokens` estimated tokens fits in both buckets. Returns the seconds spent waiting."""
+        tokens = min(tokens, self.tokens_per_minute) if self.tokens_per_minute else 0
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                request_ok = not self.requests_per_minute or self._request_allowance >= 1
+                if now >= self._paused_until and request_ok and self._token_allowance >= tokens:
+                    if self.requests_per_minute:
+                        self._request_allowance -= 1
+                    self._token_allowance -= tokens
+                    return now - start
+                wait = max(
+                    self._paused_until - now,
+                    (1 - self._request_allowance) * 60 / self.requests_per_minute if not request_ok else 0,
+                    (tokens - self._token_allowance) * 60 / self.tokens_per_minute if self.tokens_per_minute else 0,
+                )
+            time.sleep(min(max(wait, 0.05), 5.0))
+
+    def pause(self, seconds: float):
+        """Holds back every caller for `seconds`, e.g. after the provider answered with a 429."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+_pending_rate_limits = threading.local()
+
+@contextmanager
+def defer_rate_limit(rate_limiter: Optional[RateLimiter], estimated_tokens: int = 0):
+    """Registers `rate_limiter` for the calls made in this block; it is only acquired by acquire_rate_limits()."""
+    stack = _pending_rate_limits.__dict__.setdefault("stack", [])
+    entry = {"limiter": rate_limiter, "tokens": estimated_tokens, "acquired": rate_limiter is None}
+    stack.append(entry)
+    try:
+        yield entry
+    finally:
+        stack.remove(entry)
+
+def _deferred_tokens() -> int:
+    """Estimated tokens of the innermost call_with_rate_limit_retry() on this thread, for a model's own limiter."""
+    stack = getattr(_pending_rate_limits, "stack", [])
+    return stack[-1]["tokens"] if stack else 0
+
+def _rate_limit_seconds_waited() -> float:
+    """Total time this thread has spent blocked in acquire_rate_limits(); differences of it time a single call."""
+    return getattr(_pending_rate_limits, "waited", 0.0)
+
+def acquire_rate_limits():
+    """Acquires every limiter deferred on this thread that has not been acquired yet. Called right before a request
+    actually goes to the provider, so responses served from the cache never consume (or wait for) quota."""
+    for entry in getattr(_pending_rate_limits, "stack", []):
+        if not entry["acquired"]:
+            entry["acquired"] = True
+            wait = entry["limiter"].acquire(entry["tokens"])
+            _pending_rate_limits.waited = _rate_limit_seconds_waited() + wait
+            REGISTRY.observe("rate_limit_wait_seconds", wait)
+
+def call_with_rate_limit_retry(fn: Callable[[], Any], rate_limiter: Optional[RateLimiter] = None, estimated_tokens: int = 0, max_retries: int = 5, base_delay: float = 2.0, max_delay: float = 60.0) -> Any:
+    """Runs `fn` under the rate limiter, retrying 429 responses with jittered exponential backoff.
+
+    The limiter is acquired lazily through acquire_rate_limits() (call_llm does so on a cache miss), so `fn` must
+    call it before any request that does not go through call_llm.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            with defer_rate_limit(rate_limiter, estimated_tokens):
+                return fn()
+        except Exception as e:
+            if attempt >= max_retries or not is_rate_limit_error(e):
+                raise
+            REGISTRY.inc("llm_retries_total", reason="rate_limit")
+            delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+            print(f"Rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries}).")
+            if rate_limiter:
+                rate_limiter.pause(delay)
+            else:
+                time.sleep(delay)
+
+def repair_and_parse_json(llm: BaseChatModel, broken_json_string: str, validate: Optional[Callable[[Any], Any]] = None) -> Optional[Dict]:
+    """Attempts to repair a broken JSON string using an LLM. Returns None unless the result passes `validate`."""
+    repair_prompt = """
     The following string is a broken JSON object. It likely contains unescaped newlines or other syntax errors.
     Your task is to fix it and return ONLY the perfectly valid JSON object. Do not add any explanation, commentary, or markdown formatting.
 
     Broken JSON:
     ```
-    {broken_json_string}
+    {broken_json}
     ```
     """
     try:
-        repaired_response = call_llm(llm, repair_prompt, {}, response_model=None)
+        repaired_response = call_llm(llm, repair_prompt, {"broken_json": broken_json_string}, response_model=None, task="json_repair")
         repaired_json_string = clean_llm_output(repaired_response.content if hasattr(repaired_response, 'content') else str(repaired_response))
-        return json.loads(repaired_json_string)
+        try:
+            parsed = json.loads(repaired_json_string)
+        except json.JSONDecodeError:
+            return repair_json_locally(repaired_json_string, validate)
+        if validate:
+            validate(parsed)
+        return parsed
     except Exception as e:
         print(f"JSON repair failed: {e}")
         return None
 
+def _json_string_state(ch: str, in_string: bool, escaped: bool) -> Tuple[bool, bool]:
+    """Advances a minimal JSON lexer by one character, tracking whether we are inside a string literal."""
+    if in_string:
+        if escaped:
+            return True, False
+        if ch == "\\":
+            return True, True
+        return ch != '"', False
+    return ch == '"', False
+
+def _escape_raw_control_chars(text: str) -> str:
+    out, in_string, escaped = [], False, False
+    for ch in text:
+        if in_string and not escaped and ch in "\n\r\t":
+            out.append({"\n": "\\n", "\r": "\\r", "\t": "\\t"}[ch])
+            continue
+        in_string, escaped = _json_string_state(ch, in_string, escaped)
+        out.append(ch)
+    return "".join(out)
+
+def _strip_trailing_commas(text: str) -> str:
+    out, in_string, escaped = [], False, False
+    for ch in text:
+        if not in_string and ch in "}]":
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ",":
+                del out[j]
+        in_string, escaped = _json_string_state(ch, in_string, escaped)
+        out.append(ch)
+    return "".join(out)
+
+def _extract_first_json_value(text: str) -> Optional[str]:
+    """Returns the first balanced {...} or [...] in the text, or everything from its opening bracket if it is truncated."""
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return None
+    start = min(starts)
+    depth, in_string, escaped = 0, False, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if not in_string:
+            if ch in "{[":
+                depth += 1
+            elif ch in "}]":
+                depth -= 1
+                if depth == 0:
+                    return text[start:i + 1]
+        in_string, escaped = _json_string_state(ch, in_string, escaped)
+    return text[start:]
+
+def _open_brackets(text: str) -> Tuple[List[str], bool]:
+    """The closing brackets still owed at the end of `text`, innermost last, and whether it ends inside a string."""
+    stack, in_string, escaped = [], False, False
+    for ch in text:
+        if not in_string:
+            if ch in "{[":
+                stack.append("}" if ch == "{" else "]")
+            elif ch in "}]" and stack:
+                stack.pop()
+        in_string, escaped = _json_string_state(ch, in_string, escaped)
+    return stack, in_string
+
+def _close_truncated_json(text: str) -> str:
+    """Closes the open arrays and objects of a truncated value.
+
+    A trailing element that was cut off mid-way (a partial string, number or literal, or a key with no value) is
+    dropped rather than completed, so the repair never invents a value such as a half sentence or a null.
+    """
+    stack, in_string = _open_brackets(text)
+    if not stack and not in_string:
+        return text
+    text = text.rstrip()
+    if in_string or not text.endswith(('"', "}", "]", ",", "{", "[")):
+        cut = _last_separator_outside_strings(text, ",{[")
+        text = text[:cut + 1] if text[cut] in "{[" else text[:cut]
+        stack, _ = _open_brackets(text)
+    text = text.rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    return _strip_trailing_commas(text + "".join(reversed(stack)))
+
+def _last_separator_outside_strings(text: str, separators: str = ",") -> int:
+    position, in_string, escaped = -1, False, False
+    for i, ch in enumerate(text):
+        if not in_string and ch in separators:
+            position = i
+        in_string, escaped = _json_string_state(ch, in_string, escaped)
+    return position
+
+def repair_json_locally(text: str, validate: Optional[Callable[[Any], Any]] = None) -> Optional[Any]:
+    """Deterministically repairs common LLM JSON faults without another model call.
+
+    Extracts the first JSON object, escapes raw newlines/tabs inside strings, strips trailing commas and closes
+    truncated arrays and objects, dropping a trailing element that was cut off. While the result is unparseable or
+    fails `validate` (which should raise), trailing items are dropped one by one; None if nothing is left that passes.
+    """
+    candidate = _extract_first_json_value(text)
+    if candidate is None:
+        return None
+    candidate = _strip_trailing_commas(_escape_raw_control_chars(candidate))
+    while True:
+        try:
+            parsed = json.loads(_close_truncated_json(candidate))
+            if validate:
+                validate(parsed)
+            return parsed
+        except (ValueError, TypeError):
+            cut = _last_separator_outside_strings(candidate)
+            if cut <= 0:
+                return None
+            candidate = candidate[:cut]
+
+_json_parse_stats = {"direct": 0, "local_repair": 0, "llm_repair": 0, "failed": 0}
+_json_parse_stats_lock = threading.Lock()
+
+def _count_json_parse(outcome: str):
+    with _json_parse_stats_lock:
+        _json_parse_stats[outcome] += 1
+    REGISTRY.inc("json_parse_total", outcome=outcome)
+
+def get_json_parse_stats() -> Dict[str, int]:
+    """How often LLM output parsed directly, needed local repair, needed LLM repair, or could not be parsed."""
+    with _json_parse_stats_lock:
+        return dict(_json_parse_stats)
+
+def parse_llm_json(raw_text: str, llm: Optional[BaseChatModel] = None, validate: Optional[Callable[[Any], Any]] = None) -> Any:
+    """Parses JSON from LLM output: strict parse, then local repair, then (only if `llm` is given) LLM repair.
+
+    A repaired value is only accepted if `validate` (e.g. a Pydantic model) accepts it without raising, so a truncated
+    response that repairs into an incomplete object still goes on to the LLM repair.
+    """
+    cleaned_json_string = clean_llm_output(raw_text)
+    try:
+        parsed = json.loads(cleaned_json_string)
+        _count_json_parse("direct")
+        return parsed
+    except json.JSONDecodeError:
+        pass
+    parsed = repair_json_locally(cleaned_json_string, validate)
+    if parsed is not None:
+        _count_json_parse("local_repair")
+        return parsed
+    if llm is not None:
+        print("Local JSON repair failed. Falling back to LLM repair...")
+        parsed = repair_and_parse_json(llm, cleaned_json_string, validate)
+        if parsed is not None:
+            _count_json_parse("llm_repair")
+            return parsed
+    _count_json_parse("failed")
+    raise ValueError("Could not parse JSON from the LLM output.")
+
 class RequirementMatch(BaseModel):
     requirement: str
     match_status: bool
     evidence: str
 
+class CandidateAssessment(BaseModel):
+    name: str
+    summary: str
+    requirement_analysis: List[RequirementMatch]
+
 class ExplainableCandidateScore(BaseModel):
     name: str
     overall_score: int
     summary: str
     requirement_analysis: List[RequirementMatch]
+    knocked_out: bool = False
+    scored_by: Optional[str] = None
+
+def validate_assessment(data: Dict, requirements: List[str]) -> CandidateAssessment:
+    """Parses one assessment, rejecting it if it answers fewer requirements than asked (e.g. a truncated response)."""
+    assessment = CandidateAssessment(**data)
+    if len(assessment.requirement_analysis) < len(requirements):
+        raise ValueError(f"assessment covers {len(assessment.requirement_analysis)} of {len(requirements)} requirements")
+    return assessment
 
 class KeyRequirements(BaseModel):
     key_requirements: List[str]
@@ -73,6 +736,7 @@ class InterviewQuestions(BaseModel):
     behavioral: List[str]
     technical: List[str]
 
+@REGISTRY.timed("stage_seconds", stage="extract_requirements")
 def extract_key_requirements(job_description: str, llm: BaseChatModel) -> List[str]:
     """Extracts the most critical requirements from a job description."""
     prompt = """
@@ -82,31 +746,178 @@ def extract_key_requirements(job_description: str, llm: BaseChatModel) -> List[s
     Job Description:
     {jd}
     """
-    response = call_llm(llm, prompt, {"jd": job_description}, response_model=KeyRequirements)
+    response = call_llm(llm, prompt, {"jd": job_description}, response_model=KeyRequirements, task="extract_requirements")
     return response.key_requirements
 
-def score_candidate_explainable(job_description: str, resume_text: str, weighted_requirements: Dict, llm: BaseChatModel) -> ExplainableCandidateScore:
-    """Scores a candidate with detailed, explainable AI using a reliable two-step approach."""
+IMPORTANCE_PENALTIES = {"Critical": 25, "Important": 15, "Normal": 5}
+EVIDENCE_TOKEN_BUDGET = int(os.environ.get("RECRUITX_EVIDENCE_TOKENS", 1200))
+EVIDENCE_CHUNK_SIZE = 600
+
+def _normalize_requirement(requirement: str) -> str:
+    return " ".join(requirement.lower().split())
+
+def align_requirement_analysis(requirement_analysis: List[RequirementMatch], requirements: List[str]) -> List[RequirementMatch]:
+    """Maps the LLM's per-requirement verdicts back onto the canonical requirement strings, in rubric order."""
+    by_text = {_normalize_requirement(match.requirement): match for match in requirement_analysis}
+    positional = len(requirement_analysis) == len(requirements)
+    aligned = []
+    for i, requirement in enumerate(requirements):
+        match = by_text.get(_normalize_requirement(requirement)) or (requirement_analysis[i] if positional else None)
+        if match is None:
+            match = RequirementMatch(requirement=requirement, match_status=False, evidence="No direct evidence found in the resume.")
+        aligned.append(RequirementMatch(requirement=requirement, match_status=match.match_status, evidence=match.evidence))
+    return aligned
+
+def compute_candidate_score(requirement_analysis: List[Any], weighted_requirements: Dict) -> Tuple[int, bool]:
+    """Deterministically scores a candidate from per-requirement matches: 100 minus the penalty of every unmet requirement.
+
+    Returns (score, knocked_out); a candidate is knocked out when any unmet requirement is flagged as a knock-out.
+    """
+    matched = {}
+    for match in requirement_analysis:
+        match = match if isinstance(match, dict) else match.model_dump()
+        matched[_normalize_requirement(match["requirement"])] = bool(match["match_status"])
+    score, knocked_out = 100, False
+    for requirement, weight in weighted_requirements.items():
+        if matched.get(_normalize_requirement(requirement)):
+            continue
+        score -= IMPORTANCE_PENALTIES.get(weight.get("importance", "Normal"), IMPORTANCE_PENALTIES["Normal"])
+        knocked_out = knocked_out or bool(weight.get("knockout"))
+    return max(score, 0), knocked_out
+
+def rank_candidates(candidates: List[Dict]) -> List[Dict]:
+    """Orders candidates by score, with knocked-out candidates and failed analyses after everyone else."""
+    return sorted(candidates, key=lambda c: ("Error:" not in c['name'], not c.get('knocked_out', False), c['overall_score']), reverse=True)
+
+class CandidateMatrix:
+    """The analysed pool as NumPy arrays: a candidates x requirements `met` matrix plus per-candidate score and flags.
+
+    Rows follow the order of the candidate list it was built from, so index arrays map straight back to candidate
+    dicts. Filtering, ranking, top-K and re-scoring are vectorised and stay interactive for pools of 10,000+.
+    """
+    def __init__(self, candidates: List[Dict], requirements: Iterable[str] = ()):
+        self.candidates = candidates
+        self.requirements = list(requirements)
+        columns = {_normalize_requirement(requirement): j for j, requirement in enumerate(self.requirements)}
+        self.met = np.zeros((len(candidates), len(self.requirements)), dtype=bool)
+        for i, candidate in enumerate(candidates):
+            for match in candidate.get('requirement_analysis') or []:
+                j = columns.get(_normalize_requirement(match['requirement']))
+                if j is not None:
+                    self.met[i, j] = bool(match['match_status'])
+        self.scores = np.fromiter((c.get('overall_score', 0) for c in candidates), dtype=np.int16, count=len(candidates))
+        self.knocked_out = np.fromiter((bool(c.get('knocked_out')) for c in candidates), dtype=bool, count=len(candidates))
+        self.errors = np.fromiter(("Error:" in c['name'] for c in candidates), dtype=bool, count=len(candidates))
+        self.analysed = np.fromiter((bool(c.get('requirement_analysis')) for c in candidates), dtype=bool, count=len(candidates))
+        self.row_by_filename = {c.get('filename'): i for i, c in enumerate(candidates)}
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def column(self, requirement: str) -> int:
+        return self.requirements.index(requirement)
+
+    def mask(self, require_all: Iterable[str] = (), require_any: Iterable[str] = (), min_score: int = 0, exclude_knocked_out: bool = False, exclude_errors: bool = False) -> np.ndarray:
+        """Boolean row mask, e.g. everyone who meets A and C and is not knocked out."""
+        mask = self.scores >= min_score
+        if exclude_knocked_out:
+            mask &= ~self.knocked_out
+        if exclude_errors:
+            mask &= ~self.errors
+        all_columns = [self.column(requirement) for requirement in require_all]
+        if all_columns:
+            mask &= self.met[:, all_columns].all(axis=1)
+        any_columns = [self.column(requirement) for requirement in require_any]
+        if any_columns:
+            mask &= self.met[:, any_columns].any(axis=1)
+        return mask
+
+    def rescore(self, weighted_requirements: Dict) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorised compute_candidate_score for every row: (scores, knocked_out). Requirements without a column count as unmet."""
+        penalties = np.array([IMPORTANCE_PENALTIES.get(w.get("importance", "Normal"), IMPORTANCE_PENALTIES["Normal"]) for w in weighted_requirements.values()], dtype=np.int32)
+        knockouts = np.array([bool(w.get("knockout")) for w in weighted_requirements.values()], dtype=bool)
+        unmet = np.ones((len(self), len(weighted_requirements)), dtype=bool)
+        for j, requirement in enumerate(weighted_requirements):
+            if requirement in self.requirements:
+                unmet[:, j] = ~self.met[:, self.column(requirement)]
+        scores = np.maximum(100 - unmet.astype(np.int32) @ penalties, 0)
+        return scores, (unmet & knockouts).any(axis=1)
+
+    def order(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Row indices in rank_candidates order: scored before failed, not knocked out before knocked out, then by score."""
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows)
+        return rows[np.lexsort((-self.scores[rows], self.knocked_out[rows], self.errors[rows]))]
+
+    def top_k(self, k: int, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        rows = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+        return self.order(rows)[:k]
+
+    def rows(self, indices: Iterable[int]) -> List[Dict]:
+        return [self.candidates[i] for i in indices]
+
+    def requirement_table(self, indices: Iterable[int]) -> List[Dict]:
+        """One display row per candidate: name, score, requirements met, and a ✅/❌ per requirement."""
+        return [
+            {"Candidate": self.candidates[i]['name'], "Score": int(self.scores[i]), "Met": f"{int(self.met[i].sum())}/{len(self.requirements)}",
+             **{requirement: "✅" if self.met[i, j] else "❌" for j, requirement in enumerate(self.requirements)}}
+            for i in indices
+        ]
+
+def rescore_candidates(candidates: List[Dict], weighted_requirements: Dict) -> List[Dict]:
+    """Re-applies new weights to already analysed candidates and re-ranks them, without any LLM calls."""
+    matrix = CandidateMatrix(candidates, weighted_requirements)
+    scores, knocked_out = matrix.rescore(weighted_requirements)
+    rescored = [
+        {**candidate, "overall_score": int(scores[i]), "knocked_out": bool(knocked_out[i])} if matrix.analysed[i] else candidate
+        for i, candidate in enumerate(candidates)
+    ]
+    return rank_candidates(rescored)
+
+CANDIDATE_SORT_KEYS = {
+    "Rank": None,
+    "Score (high to low)": True,
+    "Score (low to high)": False,
+    "Name": None,
+}
+
+def select_candidates(candidates: List[Dict], search: str = "", sort_by: str = "Rank", min_score: int = 0, hide_knocked_out: bool = False, hide_errors: bool = False, require_all: Iterable[str] = (), matrix: Optional[CandidateMatrix] = None) -> List[Dict]:
+    """Filters and sorts the ranked candidate list for display; `search` matches the name, summary or file name.
+
+    Pass a CandidateMatrix built over `candidates` to reuse it across reruns; `require_all` needs its requirements.
+    """
+    matrix = matrix or CandidateMatrix(candidates, require_all)
+    rows = np.flatnonzero(matrix.mask(require_all=require_all, min_score=min_score, exclude_knocked_out=hide_knocked_out, exclude_errors=hide_errors))
+    needle = search.strip().lower()
+    if needle:
+        rows = np.array([i for i in rows if needle in candidates[i]['name'].lower() or needle in candidates[i].get('summary', '').lower() or needle in candidates[i].get('filename', '').lower()], dtype=np.int64)
+    if sort_by == "Name":
+        return sorted(matrix.rows(rows), key=lambda c: c['name'].lower())
+    if CANDIDATE_SORT_KEYS.get(sort_by) is not None:
+        descending = CANDIDATE_SORT_KEYS[sort_by]
+        rows = rows[np.argsort(-matrix.scores[rows] if descending else matrix.scores[rows], kind="stable")]
+    return matrix.rows(rows)
+
+@REGISTRY.timed("stage_seconds", stage="score_candidate")
+def score_candidate_explainable(job_description: str, resume_text: str, weighted_requirements: Dict, llm: BaseChatModel, evidence_token_budget: Optional[int] = EVIDENCE_TOKEN_BUDGET, evidence: Optional[str] = None) -> ExplainableCandidateScore:
+    """Scores a candidate with explainable AI: the LLM judges each requirement, the score and knock-outs are computed locally.
+
+    `evidence` is the resume text to send, as built by scoring_evidence(); it is built here if not given.
+    """
     prompt = """
-    **TASK:** Evaluate a candidate's resume against a job description and weighted requirements.
+    **TASK:** Evaluate a candidate's resume against a job description and a list of requirements.
     Your output MUST be a single, valid JSON object. Do not include any other text or markdown.
     
     **CANDIDATE NAME:** The name of the candidate is present in the resume text. You must extract it for the 'name' field.
 
-    **SCORING RULES:**
-    1. Start at 100 points.
-    2. For each requirement, if no direct evidence is found in the resume, deduct points:
-        - Critical: -25 points
-        - Important: -15 points
-        - Normal: -5 points
-    3. The `overall_score` is the final calculated score.
+    **RULES:**
+    1. Judge every requirement in the list below, in the same order, copying its text exactly.
+    2. `match_status` is true only if the resume contains direct evidence for the requirement.
 
     **JSON OUTPUT SCHEMA:**
     You must fill out this exact JSON structure:
     ```json
     {{
       "name": "string, extracted from resume",
-      "overall_score": "integer, calculated from rubric",
       "summary": "string, 2-3 sentence critical analysis of candidate's fit, highlighting gaps",
       "requirement_analysis": [
         {{
@@ -119,25 +930,162 @@ def score_candidate_explainable(job_description: str, resume_text: str, weighted
     ```
 
     **USER-PROVIDED DATA:**
-    1. WEIGHTED REQUIREMENTS: {weights}
+    1. REQUIREMENTS: {requirements}
     2. JOB DESCRIPTION: {jd}
-    3. RESUME TEXT: {resume}
+    3. RESUME TEXT (the most relevant excerpts for long resumes): {resume}
     """
+    requirements = list(weighted_requirements)
     input_data = {
-        "weights": json.dumps(weighted_requirements, indent=2),
+        "requirements": json.dumps(requirements, indent=2),
         "jd": job_description,
-        "resume": resume_text[:6000]
+        "resume": evidence if evidence is not None else scoring_evidence(resume_text, requirements, evidence_token_budget),
     }
     try:
-        raw_response = call_llm(llm, prompt, input_data, response_model=None)
+        raw_response = call_llm(llm, prompt, input_data, response_model=None, task="score")
+        scored_by = last_model_name()
         raw_json_string = raw_response.content if hasattr(raw_response, 'content') else str(raw_response)
-        cleaned_json_string = clean_llm_output(raw_json_string)
-        parsed_data = json.loads(cleaned_json_string)
-        return ExplainableCandidateScore(**parsed_data)
+        try:
+            parsed_data = parse_llm_json(raw_json_string, llm, validate=lambda data: validate_assessment(data, requirements))
+            assessment = CandidateAssessment(**parsed_data)
+        except Exception:
+            invalidate_cached_response(llm, prompt, input_data)
+            raise
+        requirement_analysis = align_requirement_analysis(assessment.requirement_analysis, requirements)
+        overall_score, knocked_out = compute_candidate_score(requirement_analysis, weighted_requirements)
+        return ExplainableCandidateScore(
+            name=assessment.name,
+            overall_score=overall_score,
+            summary=assessment.summary,
+            requirement_analysis=requirement_analysis,
+            knocked_out=knocked_out,
+            scored_by=scored_by,
+        )
     except Exception as e:
         print(f"Error scoring candidate, re-raising exception. Error: {e}")
         raise e
 
+PACKED_RESUME_TOKENS = int(os.environ.get("RECRUITX_PACKED_RESUME_TOKENS", 700))
+PACKED_TOKEN_BUDGET = int(os.environ.get("RECRUITX_PACKED_TOKEN_BUDGET", 2500))
+PACKED_MAX_RESUMES = int(os.environ.get("RECRUITX_PACKED_MAX_RESUMES", 5))
+
+def pack_resumes(resumes: Iterable[Dict], resume_tokens: int = PACKED_RESUME_TOKENS, token_budget: int = PACKED_TOKEN_BUDGET, max_resumes: int = PACKED_MAX_RESUMES) -> Iterator[List[Dict]]:
+    """Groups short resumes (at most `resume_tokens`) into packs under `token_budget`; longer resumes are yielded alone."""
+    pack, pack_tokens = [], 0
+    for resume in resumes:
+        tokens = estimate_tokens(resume["text"])
+        if tokens > resume_tokens or resume.get("extraction_error"):
+            yield [resume]
+            continue
+        if pack and (pack_tokens + tokens > token_budget or len(pack) >= max_resumes):
+            yield pack
+            pack, pack_tokens = [], 0
+        pack.append(resume)
+        pack_tokens += tokens
+    if pack:
+        yield pack
+
+def _name_match(name: str, resume_text: str) -> int:
+    """Scores how well a resume contains `name` as whole words.
+
+    3 for the full name as written (a middle initial may sit between its parts), 2 for all of its parts anywhere,
+    1 for the surname only, 0 otherwise.
+    """
+    parts = re.findall(r"\w{2,}", name.lower())
+    if not parts:
+        return 0
+    text = resume_text.lower()
+    if re.search(r"\b" + r"\W+(?:\w\W+)?".join(map(re.escape, parts)) + r"\b", text):
+        return 3
+    words = set(re.findall(r"\w+", text))
+    if all(part in words for part in parts):
+        return 2
+    return 1 if parts[-1] in words else 0
+
+@REGISTRY.timed("stage_seconds", stage="score_packed")
+def score_candidates_packed(job_description: str, resume_texts: List[str], weighted_requirements: Dict, llm: BaseChatModel) -> List[Optional[ExplainableCandidateScore]]:
+    """Scores several short resumes in one call that sends the job description and rubric once.
+
+    Every entry of the returned JSON array is validated on its own: it must name a resume of the pack that no other
+    entry claimed, pass the CandidateAssessment schema, and carry a name found in that resume (in full, or at least the
+    surname, as whole words) that no other resume of the pack matches better. Entries that fail come back as None so
+    the caller can score those resumes individually. Raises only if the response is unusable as a whole.
+    """
+    prompt = """
+    **TASK:** Evaluate EACH of the numbered candidate resumes below against the same job description and list of requirements.
+    Your output MUST be a single, valid JSON array with exactly one object per resume. Do not include any other text or markdown.
+
+    **CANDIDATE NAME:** The name of each candidate is present in their resume text. You must extract it for the 'name' field.
+
+    **RULES:**
+    1. Judge each resume on its own. Never use evidence from one resume for another.
+    2. For each resume, judge every requirement in the list below, in the same order, copying its text exactly.
+    3. `match_status` is true only if that resume contains direct evidence for the requirement.
+    4. `resume_id` is the number in the resume's header.
+
+    **JSON OUTPUT SCHEMA:**
+    You must fill out this exact JSON structure:
+    ```json
+    [
+      {{
+        "resume_id": "integer, from the resume header",
+        "name": "string, extracted from that resume",
+        "summary": "string, 2-3 sentence critical analysis of candidate's fit, highlighting gaps",
+        "requirement_analysis": [
+          {{
+            "requirement": "string, from the list below",
+            "match_status": "boolean, must be true or false",
+            "evidence": "string, direct quote from that resume or 'No direct evidence found in the resume.'"
+          }}
+        ]
+      }}
+    ]
+    ```
+
+    **USER-PROVIDED DATA:**
+    1. REQUIREMENTS: {requirements}
+    2. JOB DESCRIPTION: {jd}
+    3. RESUMES:
+    {resumes}
+    """
+    requirements = list(weighted_requirements)
+    input_data = {
+        "requirements": json.dumps(requirements, indent=2),
+        "jd": job_description,
+        "resumes": "\n\n".join(f"=== RESUME {i} ===\n{text}" for i, text in enumerate(resume_texts, start=1)),
+    }
+    raw_response = call_llm(llm, prompt, input_data, response_model=None, task="score")
+    scored_by = last_model_name()
+    raw_json_string = raw_response.content if hasattr(raw_response, 'content') else str(raw_response)
+    try:
+        entries = parse_llm_json(raw_json_string, llm, validate=lambda data: [validate_assessment(entry, requirements) for entry in (data if isinstance(data, list) else [data])])
+        if isinstance(entries, dict):
+            entries = [entries]
+        if not isinstance(entries, list):
+            raise ValueError("Packed scoring response is not a JSON array.")
+    except Exception:
+        invalidate_cached_response(llm, prompt, input_data)
+        raise
+
+    scores: List[Optional[ExplainableCandidateScore]] = [None] * len(resume_texts)
+    for position, entry in enumerate(entries):
+        try:
+            index = int(entry.get("resume_id", position + 1)) - 1
+            if not 0 <= index < len(resume_texts) or scores[index] is not None:
+                raise ValueError(f"resume_id {index + 1} is out of range or repeated")
+            assessment = CandidateAssessment(**entry)
+            if not assessment.requirement_analysis:
+                raise ValueError(f"entry for resume {index + 1} is empty")
+            name_matches = [_name_match(assessment.name, text) for text in resume_texts]
+            if not name_matches[index] or max(name_matches) > name_matches[index]:
+                raise ValueError(f"entry for resume {index + 1} names someone else ({assessment.name!r})")
+            requirement_analysis = align_requirement_analysis(assessment.requirement_analysis, requirements)
+            overall_score, knocked_out = compute_candidate_score(requirement_analysis, weighted_requirements)
+            scores[index] = ExplainableCandidateScore(name=assessment.name, overall_score=overall_score, summary=assessment.summary, requirement_analysis=requirement_analysis, knocked_out=knocked_out, scored_by=scored_by)
+        except Exception as e:
+            print(f"Discarding packed scoring entry {position + 1}: {e}")
+    return scores
+
+@REGISTRY.timed("stage_seconds", stage="interview_questions")
 def generate_interview_questions(candidate_name: str, candidate_summary: str, job_description: str, llm: BaseChatModel) -> InterviewQuestions:
     """Generates tailored interview questions using a reliable two-step approach with a repair mechanism."""
     prompt = """
@@ -155,17 +1103,15 @@ def generate_interview_questions(candidate_name: str, candidate_summary: str, jo
     """
     input_data = {"name": candidate_name, "summary": candidate_summary, "jd": job_description}
     try:
-        raw_response = call_llm(llm, prompt, input_data, response_model=None)
+        raw_response = call_llm(llm, prompt, input_data, response_model=None, task="interview_questions")
         raw_json_string = raw_response.content if hasattr(raw_response, 'content') else str(raw_response)
-        cleaned_json_string = clean_llm_output(raw_json_string)
         
         try:
-            parsed_data = json.loads(cleaned_json_string)
-        except json.JSONDecodeError:
-            print(f"Initial JSON parsing failed for {candidate_name}. Attempting to repair...")
-            parsed_data = repair_and_parse_json(llm, cleaned_json_string)
-            if not parsed_data:
-                raise ValueError("JSON repair failed.")
+            parsed_data = parse_llm_json(raw_json_string, llm, validate=lambda data: InterviewQuestions(**data))
+        except ValueError:
+            print(f"JSON parsing and repair failed for {candidate_name}.")
+            invalidate_cached_response(llm, prompt, input_data)
+            raise
         
         return InterviewQuestions(**parsed_data)
     except Exception as e:
@@ -175,38 +1121,75 @@ def generate_interview_questions(candidate_name: str, candidate_summary: str, jo
             technical=["Please try again or rephrase the analysis."]
         )
 
-def generate_email_templates(ranked_candidates: list, job_description: dict, num_to_invite: int, min_score: int, interview_datetime: str, llm: BaseChatModel) -> dict:
-    """Generates personalized interview invitation and rejection emails with scheduling details."""
-    invitations, rejections = [], []
+CANDIDATE_NAME_PLACEHOLDER = "[CANDIDATE_NAME]"
+
+def _email_body(response: Any) -> str:
+    return response.content if hasattr(response, 'content') else str(response)
+
+@REGISTRY.timed("stage_seconds", stage="email")
+def generate_invitation_email(candidate_name: str, job_title: str, interview_datetime: str, llm: BaseChatModel) -> str:
+    """Writes one personalised interview invitation."""
+    prompt = "As a friendly HR manager, write a concise, enthusiastic email to {name} for the {job_title} role. Invite them for a 1-hour virtual interview on {interview_datetime}. Ask them to confirm their availability."
+    return _email_body(call_llm(llm, prompt, {"name": candidate_name, "job_title": job_title, "interview_datetime": interview_datetime}, response_model=None, task="email"))
+
+@REGISTRY.timed("stage_seconds", stage="email")
+def generate_rejection_template(job_title: str, llm: BaseChatModel) -> str:
+    """Writes a single rejection email with a name placeholder, to be rendered for every rejected candidate."""
+    prompt = "As a polite HR manager, write a brief, respectful rejection email to a candidate for the {job_title} role. Thank them for their time and wish them luck. Address the candidate exactly as {placeholder} and do not use any other placeholders."
+    template = _email_body(call_llm(llm, prompt, {"job_title": job_title, "placeholder": CANDIDATE_NAME_PLACEHOLDER}, response_model=None, task="email"))
+    if CANDIDATE_NAME_PLACEHOLDER not in template:
+        template = f"Dear {CANDIDATE_NAME_PLACEHOLDER},\n\n{template}"
+    return template
+
+def iter_email_templates(ranked_candidates: list, job_description: dict, num_to_invite: int, min_score: int, interview_datetime: str, llm: BaseChatModel, max_workers: int = 4, rate_limiter: Optional[RateLimiter] = None) -> Iterator[Tuple[str, Dict]]:
+    """Yields ("invitation" | "rejection", {"name", "email_body"}) as emails finish.
+
+    Invitations are written concurrently, one call each; all rejections share one generated template.
+    """
     job_title = job_description.get('title', 'the position')
-    
-    candidates_to_invite = [c for c in ranked_candidates if c.get('overall_score', 0) >= min_score][:num_to_invite]
+    matrix = CandidateMatrix(ranked_candidates)
+    candidates_to_invite = matrix.rows(np.flatnonzero(matrix.mask(min_score=min_score, exclude_knocked_out=True, exclude_errors=True))[:num_to_invite])
     invited_names = {c['name'] for c in candidates_to_invite}
+    valid_names = [c.get("name", "Candidate") for c in ranked_candidates if "Error:" not in c.get("name", "Candidate")]
+    rejected_names = [name for name in valid_names if name not in invited_names]
 
-    for candidate in ranked_candidates:
-        candidate_name = candidate.get("name", "Candidate")
-        if "Error:" in candidate_name: continue
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for name in valid_names:
+            if name in invited_names:
+                future = executor.submit(call_with_rate_limit_retry, lambda name=name: generate_invitation_email(name, job_title, interview_datetime, llm), rate_limiter, 200)
+                futures[future] = ("invitation", name)
+        if rejected_names:
+            future = executor.submit(call_with_rate_limit_retry, lambda: generate_rejection_template(job_title, llm), rate_limiter, 200)
+            futures[future] = ("rejection", None)
 
-        if candidate_name in invited_names:
-            prompt = f"As a friendly HR manager, write a concise, enthusiastic email to {candidate_name} for the {job_title} role. Invite them for a 1-hour virtual interview on {interview_datetime}. Ask them to confirm their availability."
-            email_type = "invitation"
-        else:
-            prompt = f"As a polite HR manager, write a brief, respectful rejection email to {candidate_name} for the {job_title} role. Thank them for their time and wish them luck."
-            email_type = "rejection"
-        
-        try:
-            email_response = call_llm(llm, prompt, {}, response_model=None)
-            email_body = email_response.content if hasattr(email_response, 'content') else str(email_response)
-            email_template = {"name": candidate_name, "email_body": email_body}
-            if email_type == "invitation": invitations.append(email_template)
-            else: rejections.append(email_template)
-        except Exception as e:
-            print(f"Error generating email for {candidate.get('name')}: {e}")
+        for future in as_completed(futures):
+            email_type, name = futures[future]
+            try:
+                body = future.result()
+            except Exception as e:
+                print(f"Error generating {email_type} email{f' for {name}' if name else 's'}: {e}")
+                continue
+            if email_type == "invitation":
+                yield "invitation", {"name": name, "email_body": body}
+            else:
+                for rejected_name in rejected_names:
+                    yield "rejection", {"name": rejected_name, "email_body": body.replace(CANDIDATE_NAME_PLACEHOLDER, rejected_name)}
 
-    return {"invitations": invitations, "rejections": rejections}
+def generate_email_templates(ranked_candidates: list, job_description: dict, num_to_invite: int, min_score: int, interview_datetime: str, llm: BaseChatModel, max_workers: int = 4, rate_limiter: Optional[RateLimiter] = None) -> dict:
+    """Generates personalized interview invitation and rejection emails with scheduling details."""
+    emails = {"invitation": [], "rejection": []}
+    for email_type, email_template in iter_email_templates(ranked_candidates, job_description, num_to_invite, min_score, interview_datetime, llm, max_workers=max_workers, rate_limiter=rate_limiter):
+        emails[email_type].append(email_template)
+    rank = {c.get("name"): i for i, c in enumerate(ranked_candidates)}
+    return {
+        "invitations": sorted(emails["invitation"], key=lambda e: rank.get(e["name"], len(rank))),
+        "rejections": sorted(emails["rejection"], key=lambda e: rank.get(e["name"], len(rank))),
+    }
 
 def extract_pdf_text(file_object: Any) -> str:
     """Extracts text from an in-memory PDF file object."""
+    import PyPDF2
     try:
         pdf_reader = PyPDF2.PdfReader(file_object)
         return "\n".join(page.extract_text() or "" for page in pdf_reader.pages)
@@ -214,20 +1197,1043 @@ def extract_pdf_text(file_object: Any) -> str:
         print(f"Error reading PDF: {e}")
         return ""
 
+PDF_TEXT_CACHE_DIR = os.path.join(DATA_DIR, "pdf_text")
+PDF_MAX_WORKERS = int(os.environ.get("RECRUITX_PDF_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_TIMEOUT_SECONDS = float(os.environ.get("RECRUITX_PDF_TIMEOUT", 30))
+PDF_MAX_PAGES = int(os.environ.get("RECRUITX_PDF_MAX_PAGES", 20))
+
+def extract_pdf_bytes(data: bytes, max_pages: Optional[int] = PDF_MAX_PAGES) -> str:
+    """Extracts text from raw PDF bytes, reading at most `max_pages` pages."""
+    import PyPDF2
+    try:
+        pdf_reader = PyPDF2.PdfReader(io.BytesIO(data))
+        page_count = len(pdf_reader.pages) if max_pages is None else min(len(pdf_reader.pages), max_pages)
+        return "\n".join(pdf_reader.pages[i].extract_text() or "" for i in range(page_count))
+    except Exception as e:
+        print(f"Error reading PDF: {e}")
+        return ""
+
+def _read_cached_pdf_text(file_hash: str) -> Optional[str]:
+    path = os.path.join(PDF_TEXT_CACHE_DIR, f"{file_hash}.txt")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+def _write_cached_pdf_text(file_hash: str, text: str):
+    os.makedirs(PDF_TEXT_CACHE_DIR, exist_ok=True)
+    path = os.path.join(PDF_TEXT_CACHE_DIR, f"{file_hash}.txt")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+
+def extraction_error_result(filename: str, file_hash: Optional[str], error: str) -> Dict:
+    """The result row for a PDF with no usable text. It passes through scoring untouched, so every file gets a row."""
+    print(f"Could not read {filename}: {error}")
+    return {
+        "name": f"Error: {filename}",
+        "overall_score": 0,
+        "summary": f"No text could be read from this PDF. Error: {error}",
+        "requirement_analysis": [],
+        "filename": filename,
+        "file_hash": file_hash,
+        "text": "",
+        "extraction_error": True,
+    }
+
+def _extracted_resume(filename: str, file_hash: str, text: str) -> Dict:
+    if not text.strip():  # image-only pages come back as blank lines
+        REGISTRY.inc("pdf_errors_total", reason="empty")
+        return extraction_error_result(filename, file_hash, "the file contains no extractable text")
+    return {"text": text, "filename": filename, "file_hash": file_hash}
+
+def _timed_extract_pdf_bytes(data: bytes, max_pages: Optional[int]) -> Tuple[str, float]:
+    """extract_pdf_bytes plus its parse time, measured where it runs so pool queueing is never counted."""
+    start = time.perf_counter()
+    text = extract_pdf_bytes(data, max_pages)
+    return text, time.perf_counter() - start
+
+def iter_extracted_resumes(files: Iterable[Any], max_workers: int = PDF_MAX_WORKERS, timeout: float = PDF_TIMEOUT_SECONDS, max_pages: Optional[int] = PDF_MAX_PAGES) -> Iterator[Dict]:
+    """Extracts text from PDFs in a process pool, yielding {"text", "filename", "file_hash"} as each file is ready.
+
+    Text is cached by the SHA-256 of the file bytes, so re-uploaded files are never parsed twice. Files are read
+    lazily with at most one per worker in flight, and a file still being parsed after `timeout` seconds is
+    abandoned so one pathological PDF cannot stall the batch. Files that fail, time out or hold no text are
+    yielded as extraction_error_result() rows.
+    """
+    if max_workers <= 1 or (hasattr(files, "__len__") and len(files) <= 1):
+        for file in files:
+            data = file.getvalue() if hasattr(file, "getvalue") else file.read()
+            file_hash = hashlib.sha256(data).hexdigest()
+            text = _read_cached_pdf_text(file_hash)
+            REGISTRY.inc("pdf_text_cache_total", result="hit" if text is not None else "miss")
+            if text is None:
+                text, seconds = _timed_extract_pdf_bytes(data, max_pages)
+                REGISTRY.observe("stage_seconds", seconds, stage="pdf_extract")
+                _write_cached_pdf_text(file_hash, text)
+            yield _extracted_resume(file.name, file_hash, text)
+        return
+
+    files = iter(files)
+    executor = None
+    pending, started_at = {}, {}
+    exhausted = False
+    try:
+        while True:
+            # No more than one file per worker. ProcessPoolExecutor reports a future as running as soon as it is
+            # queued for a worker, so this only means "being parsed" while no worker is stuck; a stuck pool is
+            # replaced below, which keeps the timeout clock honest.
+            while not exhausted and len(pending) < max_workers:
+                file = next(files, None)
+                if file is None:
+                    exhausted = True
+                    break
+                data = file.getvalue() if hasattr(file, "getvalue") else file.read()
+                file_hash = hashlib.sha256(data).hexdigest()
+                cached_text = _read_cached_pdf_text(file_hash)
+                REGISTRY.inc("pdf_text_cache_total", result="hit" if cached_text is not None else "miss")
+                if cached_text is not None:
+                    yield _extracted_resume(file.name, file_hash, cached_text)
+                    continue
+                if executor is None:
+                    executor = _new_pdf_pool(max_workers)
+                pending[executor.submit(_timed_extract_pdf_bytes, data, max_pages)] = (file.name, file_hash, data)
+            if not pending:
+                break
+
+            done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                filename, file_hash, _ = pending.pop(future)
+                started_at.pop(future, None)
+                try:
+                    text, seconds = future.result()
+                    REGISTRY.observe("stage_seconds", seconds, stage="pdf_extract")
+                except Exception as e:
+                    REGISTRY.inc("pdf_errors_total", reason="exception")
+                    yield extraction_error_result(filename, file_hash, str(e))
+                    continue
+                _write_cached_pdf_text(file_hash, text)
+                yield _extracted_resume(filename, file_hash, text)
+
+            now = time.monotonic()
+            expired = [future for future in pending if future.running() and now - started_at.setdefault(future, now) > timeout]
+            if not expired:
+                continue
+            timed_out_files = [pending.pop(future) for future in expired]
+            # A worker stuck on a pathological PDF never returns on its own and keeps its slot. Stop the whole pool
+            # (terminating one process breaks it anyway) and give the files still in flight a fresh one.
+            _terminate_pdf_pool(executor)
+            executor = _new_pdf_pool(max_workers)
+            retry, pending, started_at = list(pending.values()), {}, {}
+            for filename, file_hash, data in retry:
+                pending[executor.submit(_timed_extract_pdf_bytes, data, max_pages)] = (filename, file_hash, data)
+            for filename, file_hash, _ in timed_out_files:
+                REGISTRY.inc("pdf_errors_total", reason="timeout")
+                yield extraction_error_result(filename, file_hash, f"text extraction exceeded {timeout:.0f}s")
+    finally:
+        if executor is not None and pending:
+            _terminate_pdf_pool(executor)  # the files still in flight are no longer wanted
+        elif executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+def _new_pdf_pool(max_workers: int) -> ProcessPoolExecutor:
+    # "spawn" keeps the workers clear of the threads (ONNX, thread pools) already running in this process.
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+def _terminate_pdf_pool(executor: ProcessPoolExecutor):
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+DUPLICATE_THRESHOLD = float(os.environ.get("RECRUITX_DUPLICATE_THRESHOLD", 0.85))
+MINHASH_PERMUTATIONS = 128
+MINHASH_BANDS = 16
+SHINGLE_WORDS = 5
+
+_minhash_rng = np.random.default_rng(20240607)
+_MINHASH_A = _minhash_rng.integers(1, 2**63, MINHASH_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_MINHASH_B = _minhash_rng.integers(0, 2**63, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+def normalize_resume_text(text: str) -> str:
+    """Lower-cases and keeps only words, so layout, punctuation and PDF extraction noise do not affect matching."""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+def minhash_signature(normalized_text: str) -> np.ndarray:
+    """MinHash signature over word shingles, computed with vectorised multiply-shift hashing."""
+    words = normalized_text.split()
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+    with np.errstate(over="ignore"):
+        return ((_MINHASH_A[:, None] * hashes[None, :] + _MINHASH_B[:, None]) >> np.uint64(32)).min(axis=1)
+
+class DuplicateDetector:
+    """Finds resumes already seen in a batch: identical normalised text first, then MinHash/LSH near-duplicates."""
+    def __init__(self, threshold: float = DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._exact: Dict[str, str] = {}
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[str]] = {}
+
+    def _bands(self, signature: np.ndarray) -> Iterator[Tuple[int, bytes]]:
+        rows = MINHASH_PERMUTATIONS // MINHASH_BANDS
+        for band in range(MINHASH_BANDS):
+            yield band, signature[band * rows:(band + 1) * rows].tobytes()
+
+    def add(self, key: str, text: str) -> Optional[Tuple[str, float]]:
+        """Registers a resume. Returns (key of the resume it duplicates, estimated similarity), or None if it is new."""
+        normalized = normalize_resume_text(text)
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        if digest in self._exact:
+            REGISTRY.inc("duplicate_resumes_total", kind="exact")
+            return self._exact[digest], 1.0
+        signature = minhash_signature(normalized)
+        candidates = {other for band in self._bands(signature) for other in self._buckets.get(band, [])}
+        best = max(((other, float(np.mean(self._signatures[other] == signature))) for other in candidates), key=lambda pair: pair[1], default=None)
+        if best and best[1] >= self.threshold:
+            REGISTRY.inc("duplicate_resumes_total", kind="near")
+            return best
+        self._exact[digest] = key
+        self._signatures[key] = signature
+        for band in self._bands(signature):
+            self._buckets.setdefault(band, []).append(key)
+        return None
+
+@REGISTRY.timed("stage_seconds", stage="dedup")
+def find_duplicate_resumes(resumes: List[Dict], threshold: float = DUPLICATE_THRESHOLD) -> Tuple[List[Dict], List[Dict]]:
+    """Splits resumes into one representative per group of near-identical texts and the remaining duplicates.
+
+    Each duplicate gets `duplicate_of` (the representative's file hash) and `duplicate_similarity`.
+    """
+    detector = DuplicateDetector(threshold)
+    unique, duplicates = [], []
+    for resume in iter_unique_resumes(resumes, detector, duplicates.append):
+        unique.append(resume)
+    return unique, duplicates
+
+def iter_unique_resumes(resumes: Iterable[Dict], detector: DuplicateDetector, on_duplicate: Callable[[Dict], None]) -> Iterator[Dict]:
+    """Streaming form of find_duplicate_resumes: yields first occurrences and hands duplicates to `on_duplicate`."""
+    for resume in resumes:
+        if resume.get("extraction_error"):
+            yield resume
+            continue
+        match = detector.add(resume["file_hash"], resume["text"])
+        if match is None:
+            yield resume
+        else:
+            on_duplicate({**resume, "duplicate_of": match[0], "duplicate_similarity": round(match[1], 3)})
+
+EMBEDDING_MODEL_NAME = "BAAI/bge-small-en-v1.5"
+EMBEDDING_BATCH_SIZE = int(os.environ.get("RECRUITX_EMBED_BATCH_SIZE", 256))
+EMBEDDING_THREADS = int(os.environ["RECRUITX_EMBED_THREADS"]) if os.environ.get("RECRUITX_EMBED_THREADS") else None
+
+_embeddings: Optional["FastEmbedEmbeddings"] = None
+_embeddings_lock = threading.Lock()
+_embedding_stats = {"model_load_seconds": 0.0, "chunks": 0, "embed_seconds": 0.0}
+
+def get_embeddings() -> "FastEmbedEmbeddings":
+    """Returns the process-wide embedding model, loading the ONNX weights only on first use."""
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                start = time.perf_counter()
+                from langchain_community.embeddings import FastEmbedEmbeddings
+                _embeddings = FastEmbedEmbeddings(model_name=EMBEDDING_MODEL_NAME, batch_size=EMBEDDING_BATCH_SIZE, threads=EMBEDDING_THREADS)
+                _embedding_stats["model_load_seconds"] = time.perf_counter() - start
+    return _embeddings
+
+def embed_texts(texts: List[str], log: bool = True) -> List[List[float]]:
+    """Embeds many texts in one batched pass through the shared model, recording throughput."""
+    if not texts:
+        return []
+    start = time.perf_counter()
+    vectors = get_embeddings().embed_documents(texts)
+    elapsed = time.perf_counter() - start
+    with _embeddings_lock:
+        _embedding_stats["chunks"] += len(texts)
+        _embedding_stats["embed_seconds"] += elapsed
+    REGISTRY.observe("stage_seconds", elapsed, stage="embed")
+    REGISTRY.inc("embedded_chunks_total", len(texts))
+    if log:
+        print(f"Embedded {len(texts)} chunks in {elapsed:.2f}s ({len(texts) / elapsed if elapsed else 0:.1f} chunks/s).")
+    return vectors
+
+@functools.lru_cache(maxsize=256)
+def embed_query_cached(text: str) -> Tuple[float, ...]:
+    """Query embedding for short texts that recur across candidates, such as the key requirements."""
+    return tuple(get_embeddings().embed_query(text))
+
+def get_embedding_stats() -> Dict[str, float]:
+    """Cumulative embedding throughput for this process, for comparing batch sizes and thread counts."""
+    stats = dict(_embedding_stats)
+    stats["chunks_per_second"] = stats["chunks"] / stats["embed_seconds"] if stats["embed_seconds"] else 0.0
+    stats["ms_per_chunk"] = 1000 * stats["embed_seconds"] / stats["chunks"] if stats["chunks"] else 0.0
+    return stats
+
+_warm_up_started = False
+_warm_up_lock = threading.Lock()
+
+def warm_up():
+    """Imports the PDF / vector stack, loads the embedding model and runs one embedding, recording how long it took."""
+    start = time.perf_counter()
+    try:
+        import faiss  # noqa: F401
+        import PyPDF2  # noqa: F401
+        from langchain.text_splitter import RecursiveCharacterTextSplitter  # noqa: F401
+        from langchain_community.vectorstores import FAISS  # noqa: F401
+        from langchain_community.vectorstores.utils import maximal_marginal_relevance  # noqa: F401
+        get_embeddings().embed_query("warm-up")
+    except Exception as e:
+        print(f"Background warm-up failed; models will load on first use instead: {e}")
+        REGISTRY.inc("warm_up_total", status="failed")
+        return
+    REGISTRY.inc("warm_up_total", status="done")
+    REGISTRY.observe("startup_seconds", time.perf_counter() - start, stage="warm_up")
+
+def warm_up_in_background() -> bool:
+    """Runs warm_up() on a daemon thread, once per process. Returns True only for the call that started it."""
+    global _warm_up_started
+    with _warm_up_lock:
+        if _warm_up_started:
+            return False
+        _warm_up_started = True
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    return True
+
+def split_resume(resume_text: str, filename: str) -> list:
+    """Splits a resume into overlapping chunks tagged with their source file."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    return text_splitter.create_documents([resume_text], metadatas=[{"source": filename}])
+
 def create_candidate_rag_retriever(resume_text: str, filename: str):
     """Creates an in-memory RAG pipeline for a SINGLE candidate's resume."""
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.create_documents([resume_text], metadatas=[{"source": filename}])
-    embeddings = FastEmbedEmbeddings(model_name="BAAI/bge-small-en-v1.5")
-    vectorstore = FAISS.from_documents(documents=splits, embedding=embeddings)
-    return vectorstore.as_retriever()
+    return create_candidate_rag_retrievers([{"text": resume_text, "filename": filename}])[filename]
+
+def create_candidate_rag_retrievers(resumes: List[Dict]) -> Dict[str, Any]:
+    """Creates one retriever per resume ({"text", "filename"}), embedding every candidate's chunks in a single batched pass."""
+    from langchain_community.vectorstores import FAISS
+    splits_per_resume = [split_resume(resume["text"], resume["filename"]) for resume in resumes]
+    all_splits = [split for splits in splits_per_resume for split in splits]
+    vectors = embed_texts([split.page_content for split in all_splits])
+
+    retrievers, offset = {}, 0
+    for resume, splits in zip(resumes, splits_per_resume):
+        if not splits:
+            continue
+        chunk_vectors = vectors[offset:offset + len(splits)]
+        offset += len(splits)
+        vectorstore = FAISS.from_embeddings(
+            text_embeddings=[(split.page_content, vector) for split, vector in zip(splits, chunk_vectors)],
+            embedding=get_embeddings(),
+            metadatas=[split.metadata for split in splits],
+        )
+        retrievers[resume["filename"]] = vectorstore.as_retriever()
+    return retrievers
+
+PRESCREEN_CHUNK_SIZE = 1500
+
+@REGISTRY.timed("stage_seconds", stage="prescreen")
+def prescreen_resumes(weighted_requirements: Dict, resumes: List[Dict], top_k: Optional[int] = None, threshold: Optional[float] = None) -> Tuple[List[Dict], List[Dict]]:
+    """Cheap embedding pre-screen: ranks resumes by cosine similarity between their chunks and each requirement.
+
+    A candidate's similarity to a requirement is their best-matching chunk; their overall similarity is the
+    importance-weighted mean over requirements. Resumes above `threshold` (and within the `top_k` best) are
+    returned first, the rest second as "screened out". Both carry `prescreen_similarity` and per-requirement scores.
+    """
+    unreadable = [resume for resume in resumes if resume.get("extraction_error")]
+    resumes = [resume for resume in resumes if not resume.get("extraction_error")]
+    requirements = list(weighted_requirements)
+    if not resumes or not requirements:
+        return resumes + unreadable, []
+
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=PRESCREEN_CHUNK_SIZE, chunk_overlap=100)
+    chunks, owners = [], []
+    for i, resume in enumerate(resumes):
+        for chunk in text_splitter.split_text(resume["text"]):
+            chunks.append(chunk)
+            owners.append(i)
+    if not chunks:
+        return list(resumes) + unreadable, []
+    chunk_vectors = np.asarray(embed_texts(chunks), dtype=np.float32)
+    requirement_vectors = np.asarray([embed_query_cached(req) for req in requirements], dtype=np.float32)
+    chunk_vectors /= np.linalg.norm(chunk_vectors, axis=1, keepdims=True) + 1e-12
+    requirement_vectors /= np.linalg.norm(requirement_vectors, axis=1, keepdims=True) + 1e-12
+
+    # Chunks are contiguous per resume, so the best chunk per (resume, requirement) is one reduceat over the similarity matrix.
+    similarities = chunk_vectors @ requirement_vectors.T
+    owners = np.asarray(owners)
+    has_chunks = np.unique(owners)
+    starts = np.searchsorted(owners, has_chunks)
+    per_requirement = np.zeros((len(resumes), len(requirements)), dtype=np.float32)
+    per_requirement[has_chunks] = np.maximum.reduceat(similarities, starts, axis=0)
+
+    weights = np.asarray([IMPORTANCE_PENALTIES.get(weighted_requirements[req].get("importance", "Normal"), IMPORTANCE_PENALTIES["Normal"]) for req in requirements], dtype=np.float32)
+    overall = per_requirement @ weights / weights.sum()
+
+    order = np.argsort(-overall, kind="stable")
+    keep = np.ones(len(resumes), dtype=bool) if threshold is None else overall >= threshold
+    if top_k is not None:
+        keep_ranked = order[keep[order]][:top_k]
+        keep = np.zeros(len(resumes), dtype=bool)
+        keep[keep_ranked] = True
+
+    selected, screened_out = [], []
+    for i in order:
+        annotated = {
+            **resumes[i],
+            "prescreen_similarity": round(float(overall[i]), 4),
+            "requirement_similarity": {req: round(float(sim), 4) for req, sim in zip(requirements, per_requirement[i])},
+        }
+        (selected if keep[i] else screened_out).append(annotated)
+    return selected + unreadable, screened_out
+
+EVIDENCE_EMBEDDING_RETRY_SECONDS = 300
+_evidence_embedding_failed_at = 0.0
+
+def scoring_evidence(resume_text: str, requirements: List[str], token_budget: Optional[int] = EVIDENCE_TOKEN_BUDGET) -> str:
+    """The resume text sent for scoring: the evidence packet, or the resume's opening if packets are off or cannot be built.
+
+    Packets need the embedding model. If it fails (offline, a failed first download), resumes are cut to their opening
+    instead of failing, and the model is not tried again for EVIDENCE_EMBEDDING_RETRY_SECONDS.
+    """
+    global _evidence_embedding_failed_at
+    prefix = resume_text[:(token_budget or EVIDENCE_TOKEN_BUDGET) * 4]
+    if not token_budget or time.monotonic() - _evidence_embedding_failed_at < EVIDENCE_EMBEDDING_RETRY_SECONDS:
+        return prefix
+    try:
+        return build_evidence_packet(resume_text, requirements, token_budget)
+    except Exception as e:
+        _evidence_embedding_failed_at = time.monotonic()
+        REGISTRY.inc("evidence_packet_fallbacks_total")
+        print(f"Could not build an evidence packet, sending the start of the resume instead: {e}")
+        return prefix
+
+@REGISTRY.timed("stage_seconds", stage="evidence_packet")
+def build_evidence_packet(resume_text: str, requirements: List[str], token_budget: int = EVIDENCE_TOKEN_BUDGET, passages_per_requirement: int = 2) -> str:
+    """Assembles the parts of a resume most relevant to the requirements, within a token budget.
+
+    Short resumes are returned whole. Otherwise the resume is split into non-overlapping passages; the opening
+    passage (name and contact details) is always kept, then each requirement's best passages are taken in
+    round-robin order, then the remaining budget is filled with the next most relevant passages. The selected
+    passages are joined in their original order.
+    """
+    if estimate_tokens(resume_text) <= token_budget or not requirements:
+        return resume_text
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    chunks = RecursiveCharacterTextSplitter(chunk_size=EVIDENCE_CHUNK_SIZE, chunk_overlap=0).split_text(resume_text)
+    if len(chunks) <= 1:
+        return resume_text[:token_budget * 4]
+
+    chunk_vectors = np.asarray(embed_texts(chunks, log=False), dtype=np.float32)
+    requirement_vectors = np.asarray([embed_query_cached(req) for req in requirements], dtype=np.float32)
+    chunk_vectors /= np.linalg.norm(chunk_vectors, axis=1, keepdims=True) + 1e-12
+    requirement_vectors /= np.linalg.norm(requirement_vectors, axis=1, keepdims=True) + 1e-12
+    similarities = chunk_vectors @ requirement_vectors.T
+    best_per_requirement = np.argsort(-similarities, axis=0)
+
+    selected, used_tokens = set(), 0
+
+    def take(i: int):
+        nonlocal used_tokens
+        cost = estimate_tokens(chunks[i])
+        if i not in selected and used_tokens + cost <= token_budget:
+            selected.add(i)
+            used_tokens += cost
+
+    take(0)
+    for rank in range(min(passages_per_requirement, len(chunks))):
+        for j in range(len(requirements)):
+            take(int(best_per_requirement[rank, j]))
+    for i in np.argsort(-similarities.max(axis=1)):
+        take(int(i))
+    return "\n...\n".join(chunks[i] for i in sorted(selected))
+
+def resume_id(resume_text: str) -> str:
+    """Stable content-derived identifier for a resume, used to key its chunks in the shared index."""
+    return hashlib.sha256(resume_text.encode("utf-8")).hexdigest()[:16]
+
+class CandidateIndex:
+    """A single FAISS index holding every candidate's resume chunks, persisted to disk and memory-mapped on load."""
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._vectorstore: Optional["FAISS"] = None
+        self._mmapped = False
+        self._ranges: Dict[str, Tuple[int, int]] = {}
+        self._text_bytes = 0
+        self._loaded_mtime = 0.0
+        self._load()
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.faiss")
+
+    @property
+    def _docstore_path(self) -> str:
+        return os.path.join(self.directory, "index.pkl")
+
+    def _load(self, mmap: bool = True):
+        if not (os.path.exists(self._index_path) and os.path.exists(self._docstore_path)):
+            return
+        import faiss
+        from langchain_community.vectorstores import FAISS
+        index = faiss.read_index(self._index_path, faiss.IO_FLAG_MMAP_IFC if mmap else 0)  # plain IO_FLAG_MMAP still copies flat vectors into RAM
+        with open(self._docstore_path, "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        self._vectorstore = FAISS(embedding_function=get_embeddings(), index=index, docstore=docstore, index_to_docstore_id=index_to_docstore_id)
+        self._mmapped = mmap
+        self._loaded_mtime = os.path.getmtime(self._index_path)
+        self._ranges, self._text_bytes = {}, 0
+        for position in sorted(index_to_docstore_id):
+            document = docstore.search(index_to_docstore_id[position])
+            candidate_id = document.metadata["candidate_id"]
+            start, _ = self._ranges.get(candidate_id, (position, position))
+            self._ranges[candidate_id] = (start, position + 1)
+            self._text_bytes += len(document.page_content)
+
+    def _save(self):
+        import faiss
+        os.makedirs(self.directory, exist_ok=True)
+        faiss.write_index(self._vectorstore.index, self._index_path + ".tmp")
+        with open(self._docstore_path + ".tmp", "wb") as f:
+            pickle.dump((self._vectorstore.docstore, self._vectorstore.index_to_docstore_id), f)
+        os.replace(self._index_path + ".tmp", self._index_path)
+        os.replace(self._docstore_path + ".tmp", self._docstore_path)
+        self._loaded_mtime = os.path.getmtime(self._index_path)
+
+    def __contains__(self, candidate_id: str) -> bool:
+        return candidate_id in self._ranges
+
+    def __len__(self) -> int:
+        return len(self._ranges)
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size: chunk text plus float32 vectors.
+
+        Vectors are left out only after an IO_FLAG_MMAP_IFC load, which maps them from disk instead of copying them
+        (a 100k-chunk index measured ~0.1 MB resident against ~300 MB loaded normally). Any other load counts them.
+        """
+        if self._vectorstore is None:
+            return 0
+        index = self._vectorstore.index
+        return self._text_bytes + (0 if self._mmapped else index.ntotal * index.d * 4)
+
+    @REGISTRY.timed("stage_seconds", stage="index_add")
+    def add_resumes(self, resumes: List[Dict]) -> List[str]:
+        """Incrementally indexes resumes ({"text", "filename", "name"}) not already present. Returns their candidate ids."""
+        from langchain_community.vectorstores import FAISS
+        with self._lock:
+            new_resumes, candidate_ids = {}, []
+            for resume in resumes:
+                candidate_id = resume_id(resume["text"])
+                candidate_ids.append(candidate_id)
+                if candidate_id not in self._ranges:
+                    new_resumes[candidate_id] = resume
+            if not new_resumes:
+                return candidate_ids
+            if os.path.exists(self._index_path) and os.path.getmtime(self._index_path) > self._loaded_mtime:
+                # Another instance (one evicted from the cache but still in use) wrote since we loaded; build on its version.
+                self._load(mmap=False)
+                new_resumes = {candidate_id: resume for candidate_id, resume in new_resumes.items() if candidate_id not in self._ranges}
+                if not new_resumes:
+                    return candidate_ids
+
+            documents = []
+            for candidate_id, resume in new_resumes.items():
+                for split in split_resume(resume["text"], resume["filename"]):
+                    split.metadata.update({"candidate_id": candidate_id, "candidate": resume.get("name", resume["filename"])})
+                    documents.append(split)
+            vectors = embed_texts([doc.page_content for doc in documents])
+            text_embeddings = [(doc.page_content, vector) for doc, vector in zip(documents, vectors)]
+            metadatas = [doc.metadata for doc in documents]
+
+            if self._vectorstore is None:
+                self._vectorstore = FAISS.from_embeddings(text_embeddings=text_embeddings, embedding=get_embeddings(), metadatas=metadatas)
+                start, self._text_bytes = 0, 0
+            else:
+                if self._mmapped:
+                    self._load(mmap=False)
+                start = self._vectorstore.index.ntotal
+                self._vectorstore.add_embeddings(text_embeddings=text_embeddings, metadatas=metadatas)
+
+            for offset, metadata in enumerate(metadatas, start=start):
+                first, _ = self._ranges.get(metadata["candidate_id"], (offset, offset))
+                self._ranges[metadata["candidate_id"]] = (first, offset + 1)
+            self._text_bytes += sum(len(doc.page_content) for doc in documents)
+            self._save()
+            return candidate_ids
+
+    @REGISTRY.timed("stage_seconds", stage="index_search")
+    def search(self, query: str, candidate_id: str, k: int = 4, search_type: str = "similarity", fetch_k: int = 20, lambda_mult: float = 0.5, score_threshold: Optional[float] = None) -> List[Document]:
+        """Returns up to `k` chunks of one candidate for the query.
+
+        `search_type="mmr"` re-ranks the closest `fetch_k` chunks for diversity. `score_threshold` drops chunks whose
+        relevance (cosine similarity, from the squared L2 distance of normalised embeddings) is below it.
+        """
+        import faiss
+        from langchain_community.vectorstores.utils import maximal_marginal_relevance
+        if candidate_id not in self._ranges:
+            return []
+        query_vector = np.array([embed_query_cached(query)], dtype=np.float32)
+        start, end = self._ranges[candidate_id]
+        params = faiss.SearchParameters()
+        params.sel = faiss.IDSelectorRange(start, end)
+        fetch = min(max(k, fetch_k) if search_type == "mmr" else k, end - start)
+        with self._lock:
+            distances, positions = self._vectorstore.index.search(query_vector, fetch, params=params)
+            hits = [(float(distance), int(position)) for distance, position in zip(distances[0], positions[0]) if position != -1]
+            if score_threshold is not None:
+                hits = [(distance, position) for distance, position in hits if 1 - distance / 2 >= score_threshold]
+            if search_type == "mmr" and len(hits) > k:
+                vectors = [self._vectorstore.index.reconstruct(position) for _, position in hits]
+                hits = [hits[i] for i in maximal_marginal_relevance(query_vector[0], vectors, lambda_mult=lambda_mult, k=k)]
+            documents = []
+            for distance, position in hits[:k]:
+                doc = self._vectorstore.docstore.search(self._vectorstore.index_to_docstore_id[position])
+                documents.append(Document(page_content=doc.page_content, metadata={**doc.metadata, "distance": distance, "relevance": 1 - distance / 2}))
+        return documents
+
+    @REGISTRY.timed("stage_seconds", stage="index_search_all")
+    def search_all(self, query: str, candidate_ids: Optional[Iterable[str]] = None, k: int = 4, score_threshold: Optional[float] = None) -> Dict[str, List[Document]]:
+        """Returns up to `k` chunks per candidate for the query from one range search over the whole index.
+
+        Only candidates with at least one chunk at or above `score_threshold` relevance appear in the result.
+        """
+        if self._vectorstore is None or not self._ranges:
+            return {}
+        query_vector = np.array([embed_query_cached(query)], dtype=np.float32)
+        ranges = sorted((start, end, candidate_id) for candidate_id, (start, end) in self._ranges.items())
+        starts = np.array([start for start, _, _ in ranges])
+        ends = np.array([end for _, end, _ in ranges])
+        wanted = np.ones(len(ranges), dtype=bool) if candidate_ids is None else np.isin([candidate_id for _, _, candidate_id in ranges], list(candidate_ids))
+        # Squared L2 between normalised vectors is at most 4; relevance >= t is distance <= 2 * (1 - t).
+        radius = 4.0 + 1e-3 if score_threshold is None else 2 * (1 - score_threshold) + 1e-6
+        with self._lock:
+            _, distances, positions = self._vectorstore.index.range_search(query_vector, radius)
+            owners = np.searchsorted(starts, positions, side="right") - 1
+            keep = (owners >= 0) & (positions < ends[owners]) & wanted[owners]
+            distances, positions, owners = distances[keep], positions[keep], owners[keep]
+            order = np.lexsort((distances, owners))
+            distances, positions, owners = distances[order], positions[order], owners[order]
+            group_start = np.r_[True, owners[1:] != owners[:-1]] if len(owners) else np.zeros(0, dtype=bool)
+            rank = np.arange(len(owners)) - np.maximum.accumulate(np.where(group_start, np.arange(len(owners)), 0))
+            results: Dict[str, List[Document]] = {}
+            for distance, position, owner in zip(distances[rank < k], positions[rank < k], owners[rank < k]):
+                doc = self._vectorstore.docstore.search(self._vectorstore.index_to_docstore_id[int(position)])
+                results.setdefault(ranges[owner][2], []).append(Document(page_content=doc.page_content, metadata={**doc.metadata, "distance": float(distance), "relevance": 1 - float(distance) / 2}))
+        return results
+
+    def as_retriever(self, candidate_id: str, **search_kwargs) -> "CandidateRetriever":
+        return CandidateRetriever(index=self, candidate_id=candidate_id, **search_kwargs)
+
+class CandidateRetriever(BaseRetriever):
+    """Retriever restricted to one candidate's chunks inside a shared CandidateIndex."""
+    index: Any
+    candidate_id: str
+    k: int = 4
+    search_type: str = "similarity"
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+    score_threshold: Optional[float] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        return self.index.search(query, self.candidate_id, k=self.k, search_type=self.search_type, fetch_k=self.fetch_k, lambda_mult=self.lambda_mult, score_threshold=self.score_threshold)
+
+INDEX_CACHE_SIZE = int(os.environ.get("RECRUITX_INDEX_CACHE_SIZE", 8))
+INDEX_CACHE_BYTES = int(os.environ.get("RECRUITX_INDEX_CACHE_MB", 256)) * 1024 * 1024
+RETRIEVER_CACHE_SIZE = int(os.environ.get("RECRUITX_RETRIEVER_CACHE_SIZE", 512))
+
+_candidate_indexes: "OrderedDict[str, CandidateIndex]" = OrderedDict()
+_candidate_indexes_lock = threading.Lock()
+_retrievers: "OrderedDict[Tuple, CandidateRetriever]" = OrderedDict()
+_retrievers_lock = threading.Lock()
+
+def get_candidate_index(job_description: Optional[str] = None) -> CandidateIndex:
+    """Returns the process-wide index for a job (keyed by the JD text), or the tenant-wide index when no JD is given.
+
+    Loaded indexes are kept in an LRU bounded by INDEX_CACHE_SIZE and INDEX_CACHE_BYTES; an evicted index is simply
+    memory-mapped from disk again the next time it is needed.
+    """
+    key = hashlib.sha256(job_description.encode("utf-8")).hexdigest()[:16] if job_description else "tenant"
+    with _candidate_indexes_lock:
+        if key in _candidate_indexes:
+            _candidate_indexes.move_to_end(key)
+            return _candidate_indexes[key]
+        index = _candidate_indexes[key] = CandidateIndex(os.path.join(DATA_DIR, "indexes", key))
+        while len(_candidate_indexes) > 1 and (len(_candidate_indexes) > INDEX_CACHE_SIZE or sum(i.memory_bytes() for i in _candidate_indexes.values()) > INDEX_CACHE_BYTES):
+            _, evicted = _candidate_indexes.popitem(last=False)
+            _drop_retrievers(lambda retriever: retriever.index is evicted)
+            REGISTRY.inc("cache_evictions_total", cache="candidate_index")
+        return index
+
+def _drop_retrievers(predicate: Callable[["CandidateRetriever"], bool]):
+    with _retrievers_lock:
+        for key in [key for key, retriever in _retrievers.items() if predicate(retriever)]:
+            drop_rag_chains(_retrievers.pop(key))
+
+def get_candidate_retriever(job_description: str, candidate_id: str, load_resume: Callable[[], Dict], **search_kwargs) -> "CandidateRetriever":
+    """Returns a cached retriever for one candidate, indexing the resume on first use.
+
+    `load_resume` is only called when the candidate is not in the job's index yet and must return
+    {"text", "filename", "name"}. Retrievers live in a process-wide LRU of RETRIEVER_CACHE_SIZE entries shared by all
+    sessions; an evicted one is rebuilt transparently on its next use.
+    """
+    index = get_candidate_index(job_description)
+    if candidate_id not in index:
+        index.add_resumes([load_resume()])
+        REGISTRY.inc("lazy_index_builds_total")
+    key = (index.directory, candidate_id, tuple(sorted(search_kwargs.items())))
+    with _retrievers_lock:
+        retriever = _retrievers.get(key)
+        if retriever is not None and retriever.index is index:
+            _retrievers.move_to_end(key)
+            REGISTRY.inc("retriever_cache_requests_total", result="hit")
+            return retriever
+        REGISTRY.inc("retriever_cache_requests_total", result="miss")
+        retriever = _retrievers[key] = index.as_retriever(candidate_id, **search_kwargs)
+        while len(_retrievers) > RETRIEVER_CACHE_SIZE:
+            drop_rag_chains(_retrievers.popitem(last=False)[1])
+            REGISTRY.inc("cache_evictions_total", cache="retriever")
+        return retriever
+
+class JobStore:
+    """Persistent (SQLite) store of jobs keyed by JD and requirement weights: extracted text, scores with evidence, and chat history.
+
+    The embedded chunks live next to it in the job's CandidateIndex, so reopening a job needs no LLM or embedding calls.
+    """
+    def __init__(self, path: str = os.path.join(DATA_DIR, "jobs.sqlite")):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, title TEXT NOT NULL, job_description TEXT NOT NULL, "
+            "weighted_requirements TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS candidates ("
+            "job_id TEXT NOT NULL, file_hash TEXT NOT NULL, candidate_id TEXT NOT NULL, filename TEXT NOT NULL, "
+            "text TEXT NOT NULL, result TEXT NOT NULL, scored_at REAL NOT NULL, PRIMARY KEY (job_id, file_hash));"
+            "CREATE TABLE IF NOT EXISTS chat_messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, file_hash TEXT NOT NULL, "
+            "role TEXT NOT NULL, content TEXT NOT NULL, created_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS chat_messages_job ON chat_messages (job_id, file_hash, id);"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_job_id(job_description: str, weighted_requirements: Dict) -> str:
+        material = json.dumps([job_description.strip(), weighted_requirements], sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+    def save_job(self, job_description: str, weighted_requirements: Dict) -> str:
+        """Creates the job if it is new and returns its id."""
+        job_id = self.make_job_id(job_description, weighted_requirements)
+        title = next((line.strip() for line in job_description.splitlines() if line.strip()), "Untitled job")[:120]
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (job_id, title, job_description, weighted_requirements, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, title, job_description, json.dumps(weighted_requirements), now, now),
+            )
+            self._conn.commit()
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT title, job_description, weighted_requirements FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {"job_id": job_id, "title": row[0], "job_description": row[1], "weighted_requirements": json.loads(row[2])}
+
+    def list_jobs(self) -> List[Dict]:
+        """Saved jobs, most recently updated first, with their candidate counts."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT j.job_id, j.title, j.updated_at, COUNT(c.file_hash) FROM jobs j LEFT JOIN candidates c ON c.job_id = j.job_id "
+                "GROUP BY j.job_id ORDER BY j.updated_at DESC"
+            ).fetchall()
+        return [{"job_id": row[0], "title": row[1], "updated_at": row[2], "candidates": row[3]} for row in rows]
+
+    def scored_file_hashes(self, job_id: str) -> set:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT file_hash FROM candidates WHERE job_id = ?", (job_id,))}
+
+    def save_candidates(self, job_id: str, candidates: List[Dict], texts_by_hash: Dict[str, str]):
+        """Stores successfully scored candidates (result dicts carrying a file_hash) with their extracted text."""
+        now = time.time()
+        rows = [
+            (job_id, c['file_hash'], resume_id(texts_by_hash[c['file_hash']]), c['filename'], texts_by_hash[c['file_hash']], json.dumps({k: v for k, v in c.items() if k != "candidate_id"}), now)
+            for c in candidates
+            if "Error:" not in c['name'] and c.get('file_hash') in texts_by_hash
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO candidates (job_id, file_hash, candidate_id, filename, text, result, scored_at) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (now, job_id))
+            self._conn.commit()
+
+    def load_candidates(self, job_id: str) -> List[Dict]:
+        """Stored results of a job, each with its CandidateIndex `candidate_id` added."""
+        with self._lock:
+            rows = self._conn.execute("SELECT result, candidate_id FROM candidates WHERE job_id = ? ORDER BY scored_at", (job_id,)).fetchall()
+        return [{**json.loads(row[0]), "candidate_id": row[1]} for row in rows]
+
+    def load_text(self, job_id: str, file_hash: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM candidates WHERE job_id = ? AND file_hash = ?", (job_id, file_hash)).fetchone()
+        return row[0] if row else None
+
+    def load_texts(self, job_id: str) -> Dict[str, str]:
+        """Extracted resume text of a job's candidates by file hash."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT file_hash, text FROM candidates WHERE job_id = ?", (job_id,)).fetchall())
+
+    def copy_job(self, job_id: str, weighted_requirements: Dict, candidates: List[Dict]) -> str:
+        """Saves re-weighted results as the job for the new weights, reusing the stored text and chat history."""
+        job = self.get_job(job_id)
+        new_job_id = self.save_job(job["job_description"], weighted_requirements)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO candidates SELECT ?, file_hash, candidate_id, filename, text, result, scored_at FROM candidates WHERE job_id = ?",
+                (new_job_id, job_id),
+            )
+            self._conn.executemany(
+                "UPDATE candidates SET result = ? WHERE job_id = ? AND file_hash = ?",
+                [(json.dumps({k: v for k, v in c.items() if k != "candidate_id"}), new_job_id, c['file_hash']) for c in candidates if c.get('file_hash')],
+            )
+            if new_job_id != job_id and not self._conn.execute("SELECT 1 FROM chat_messages WHERE job_id = ? LIMIT 1", (new_job_id,)).fetchone():
+                self._conn.execute(
+                    "INSERT INTO chat_messages (job_id, file_hash, role, content, created_at) SELECT ?, file_hash, role, content, created_at FROM chat_messages WHERE job_id = ? ORDER BY id",
+                    (new_job_id, job_id),
+                )
+            self._conn.commit()
+        return new_job_id
+
+    def append_chat_message(self, job_id: str, file_hash: str, role: str, content: str):
+        with self._lock:
+            self._conn.execute("INSERT INTO chat_messages (job_id, file_hash, role, content, created_at) VALUES (?, ?, ?, ?, ?)", (job_id, file_hash, role, content, time.time()))
+            self._conn.commit()
+
+    def load_chat_histories(self, job_id: str) -> Dict[str, List[Dict]]:
+        """Chat messages of a job grouped by candidate file hash, oldest first."""
+        histories: Dict[str, List[Dict]] = {}
+        with self._lock:
+            for file_hash, role, content in self._conn.execute("SELECT file_hash, role, content FROM chat_messages WHERE job_id = ? ORDER BY id", (job_id,)):
+                histories.setdefault(file_hash, []).append({"role": role, "content": content})
+        return histories
+
+    def delete_job(self, job_id: str):
+        with self._lock:
+            for table in ("chat_messages", "candidates", "jobs"):
+                self._conn.execute(f"DELETE FROM {table} WHERE job_id = ?", (job_id,))
+            self._conn.commit()
+
+_job_store: Optional[JobStore] = None
+_job_store_lock = threading.Lock()
+
+def get_job_store() -> JobStore:
+    """Returns the process-wide job store under DATA_DIR."""
+    global _job_store
+    with _job_store_lock:
+        if _job_store is None:
+            _job_store = JobStore()
+        return _job_store
+
+RAG_PROMPT = ChatPromptTemplate.from_template("Answer the question based ONLY on the provided context.\n\nContext:\n{context}\n\nQuestion: {input}")
+RAG_CHAIN_CACHE_SIZE = 256
+
+_rag_chains: "OrderedDict[Tuple[int, int], Tuple[Any, BaseChatModel, Runnable]]" = OrderedDict()
+_rag_chains_lock = threading.Lock()
+
+def _format_context(documents: List[Document]) -> str:
+    return "\n\n".join(doc.page_content for doc in documents)
+
+def get_rag_chain(retriever, llm: BaseChatModel) -> Runnable:
+    """Returns the question -> answer message chain for one retriever, built on first use and reused for every later message."""
+    key = (id(retriever), id(llm))
+    with _rag_chains_lock:
+        entry = _rag_chains.get(key)
+        if entry and entry[0] is retriever and entry[1] is llm:
+            _rag_chains.move_to_end(key)
+            return entry[2]
+        chain = {"context": retriever | RunnableLambda(_format_context), "input": RunnablePassthrough()} | RAG_PROMPT | llm
+        _rag_chains[key] = (retriever, llm, chain)
+        if len(_rag_chains) > RAG_CHAIN_CACHE_SIZE:
+            _rag_chains.popitem(last=False)
+        return chain
+
+def drop_rag_chains(retriever):
+    """Forgets the chains built over a retriever, so an evicted retriever (and the index it holds) can be freed."""
+    with _rag_chains_lock:
+        for key in [key for key, entry in _rag_chains.items() if entry[0] is retriever]:
+            del _rag_chains[key]
+
+def stream_rag_answer(retriever, question: str, llm: BaseChatModel) -> Iterator[str]:
+    """Streams the RAG answer token by token, recording time to first token and total answer time."""
+    start = time.perf_counter()
+    first = True
+    with REGISTRY.timer("stage_seconds", stage="rag_question"):
+        answer = lambda model: _stream_counted(model, get_rag_chain(retriever, model).stream(question))
+        tokens = llm.stream("rag", answer) if isinstance(llm, ModelRouter) else answer(llm)
+        for token in tokens:
+            if first:
+                REGISTRY.observe("rag_first_token_seconds", time.perf_counter() - start)
+                first = False
+            yield token
 
 def ask_rag_question(retriever, question: str, llm: BaseChatModel) -> str:
     """Asks a question to the RAG pipeline."""
-    template = "Answer the question based ONLY on the provided context.\n\nContext:\n{context}\n\nQuestion: {input}"
-    prompt = ChatPromptTemplate.from_template(template)
-    document_chain = create_stuff_documents_chain(llm, prompt)
-    retrieval_chain = create_retrieval_chain(retriever, document_chain)
-    
-    response = retrieval_chain.invoke({"input": question})
-    return response["answer"]
\ No newline at end of file
+    return "".join(stream_rag_answer(retriever, question, llm))
+
+BROADCAST_SCORE_THRESHOLD = 0.6
+BROADCAST_OUTPUT_TOKENS = 300
+
+def iter_broadcast_answers(job_description: str, candidates: List[Dict], question: str, llm: BaseChatModel, load_resume: Callable[[Dict], Dict], k: int = 4, score_threshold: Optional[float] = BROADCAST_SCORE_THRESHOLD, max_workers: int = 4, rate_limiter: Optional[RateLimiter] = None) -> Iterator[Dict]:
+    """Asks one question about every candidate ({"name", "filename", "candidate_id"}), yielding a row per candidate as it finishes.
+
+    Chunks for all candidates come from a single search over the job's CandidateIndex (candidates not indexed yet are
+    embedded first, in one batch via `load_resume(candidate)`). Candidates with no chunk at or above `score_threshold`
+    get a "no relevant evidence" row without an LLM call; the rest are answered concurrently under the rate limiter.
+    Each row is {"name", "filename", "overall_score", "answered", "answer", "relevance", "citations": [{"text", "relevance"}]}.
+    """
+    index = get_candidate_index(job_description)
+    missing = [candidate for candidate in candidates if candidate['candidate_id'] not in index]
+    if missing:
+        index.add_resumes([load_resume(candidate) for candidate in missing])
+        REGISTRY.inc("lazy_index_builds_total", len(missing))
+    hits = index.search_all(question, [candidate['candidate_id'] for candidate in candidates], k=k, score_threshold=score_threshold)
+    def row(candidate: Dict, answer: Optional[str], documents: List[Document]) -> Dict:
+        return {
+            "name": candidate['name'],
+            "filename": candidate['filename'],
+            "overall_score": candidate.get('overall_score', 0),
+            "answered": answer is not None,
+            "answer": answer if answer is not None else "No relevant evidence in this resume.",
+            "relevance": max((doc.metadata["relevance"] for doc in documents), default=0.0),
+            "citations": [{"text": doc.page_content, "relevance": doc.metadata["relevance"]} for doc in documents],
+        }
+
+    def answer(documents: List[Document]) -> str:
+        context = _format_context(documents)
+        estimated_tokens = estimate_tokens(context) + estimate_tokens(question) + BROADCAST_OUTPUT_TOKENS
+        return call_with_rate_limit_retry(lambda: run_task(llm, "rag", lambda model: _invoke_counted(model, RAG_PROMPT, {"context": context, "input": question}).content), rate_limiter, estimated_tokens)
+
+    with REGISTRY.timer("stage_seconds", stage="rag_broadcast"), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for candidate in candidates:
+            documents = hits.get(candidate['candidate_id'])
+            if documents:
+                futures[executor.submit(answer, documents)] = (candidate, documents)
+            else:
+                REGISTRY.inc("broadcast_answers_total", result="skipped")
+                yield row(candidate, None, [])
+        for future in as_completed(futures):
+            candidate, documents = futures[future]
+            try:
+                text = future.result()
+                REGISTRY.inc("broadcast_answers_total", result="answered")
+            except Exception as e:
+                print(f"Error answering for {candidate['name']}: {e}")
+                REGISTRY.inc("broadcast_answers_total", result="error")
+                text = f"Error: {e}"
+            yield row(candidate, text, documents)
+
+SCORING_OUTPUT_TOKENS = 500
+
+def scoring_error_result(filename: str, error: Exception) -> Dict:
+    """Builds the placeholder result row shown for a resume that could not be scored."""
+    return {
+        "name": f"Error: {filename}",
+        "overall_score": 0,
+        "summary": f"The AI failed to process this resume. Please check the file. Error: {error}",
+        "requirement_analysis": [],
+        "filename": filename
+    }
+
+def score_resume(job_description: str, resume: Dict, weighted_requirements: Dict, llm: BaseChatModel, rate_limiter: Optional[RateLimiter] = None, max_retries: int = 5, evidence_token_budget: Optional[int] = EVIDENCE_TOKEN_BUDGET, queued_at: Optional[float] = None) -> Dict:
+    """Scores one resume under the rate limiter with 429 retries. Never raises: failures become an error result row."""
+    if resume.get("extraction_error"):
+        return {key: value for key, value in resume.items() if key != "text"}
+    if queued_at is not None:
+        REGISTRY.observe("queue_wait_seconds", time.monotonic() - queued_at, stage="scoring")
+    estimated_tokens = estimate_tokens(job_description + json.dumps(list(weighted_requirements), indent=2)) + min(estimate_tokens(resume["text"]), EVIDENCE_TOKEN_BUDGET) + SCORING_OUTPUT_TOKENS
+    try:
+        # Built once, not on every 429 retry.
+        evidence = scoring_evidence(resume["text"], list(weighted_requirements), evidence_token_budget)
+        score_data = call_with_rate_limit_retry(
+            lambda: score_candidate_explainable(job_description, resume["text"], weighted_requirements, llm, evidence_token_budget, evidence),
+            rate_limiter=rate_limiter,
+            estimated_tokens=estimated_tokens,
+            max_retries=max_retries,
+        )
+        return scored_result(score_data, resume)
+    except Exception as e:
+        print(f"Error processing {resume['filename']}: {e}")
+        return scoring_error_result(resume['filename'], e)
+
+def scored_result(score_data: ExplainableCandidateScore, resume: Dict) -> Dict:
+    """The candidate result dict for a scored resume."""
+    result_dict = score_data.model_dump()
+    result_dict['filename'] = resume['filename']
+    if resume.get('file_hash'):
+        result_dict['file_hash'] = resume['file_hash']
+    return result_dict
+
+def score_resume_batch(job_description: str, resumes: List[Dict], weighted_requirements: Dict, llm: BaseChatModel, rate_limiter: Optional[RateLimiter] = None, max_retries: int = 5, evidence_token_budget: Optional[int] = EVIDENCE_TOKEN_BUDGET, queued_at: Optional[float] = None) -> List[Dict]:
+    """Scores a pack from pack_resumes() in one call, falling back to score_resume for entries that fail. Never raises."""
+    if len(resumes) == 1:
+        return [score_resume(job_description, resumes[0], weighted_requirements, llm, rate_limiter, max_retries, evidence_token_budget, queued_at)]
+    if queued_at is not None:
+        REGISTRY.observe("queue_wait_seconds", time.monotonic() - queued_at, stage="scoring")
+    estimated_tokens = estimate_tokens(job_description + json.dumps(list(weighted_requirements), indent=2)) + sum(estimate_tokens(resume["text"]) for resume in resumes) + SCORING_OUTPUT_TOKENS * len(resumes)
+    try:
+        scores = call_with_rate_limit_retry(
+            lambda: score_candidates_packed(job_description, [resume["text"] for resume in resumes], weighted_requirements, llm),
+            rate_limiter=rate_limiter,
+            estimated_tokens=estimated_tokens,
+            max_retries=max_retries,
+        )
+    except Exception as e:
+        print(f"Packed scoring of {len(resumes)} resumes failed, scoring them one at a time: {e}")
+        scores = [None] * len(resumes)
+    results = []
+    for resume, score_data in zip(resumes, scores):
+        REGISTRY.inc("packed_scoring_total", result="fallback" if score_data is None else "packed")
+        results.append(score_resume(job_description, resume, weighted_requirements, llm, rate_limiter, max_retries, evidence_token_budget) if score_data is None else scored_result(score_data, resume))
+    return results
+
+def iter_scored_candidates(job_description: str, resumes: Iterable[Dict], weighted_requirements: Dict, llm: BaseChatModel, max_workers: int = 4, rate_limiter: Optional[RateLimiter] = None, max_retries: int = 5, evidence_token_budget: Optional[int] = EVIDENCE_TOKEN_BUDGET, packed: bool = False) -> Iterator[Dict]:
+    """Scores resumes ({"text", "filename"}) on a bounded thread pool, yielding each result dict as soon as it is ready.
+
+    With `packed`, short resumes are grouped by pack_resumes() and each group is scored in one call. At most two
+    packs per worker are queued, so the input (and the PDF extraction feeding it) is only read as fast as it is scored.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for pack in pack_resumes(resumes) if packed else ([resume] for resume in resumes):
+            if len(pending) >= 2 * max_workers:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield from future.result()
+            pending.add(executor.submit(score_resume_batch, job_description, pack, weighted_requirements, llm, rate_limiter, max_retries, evidence_token_budget, time.monotonic()))
+        for future in as_completed(pending):
+            yield from future.result()
+
+def score_candidates_concurrently(job_description: str, resumes: Iterable[Dict], weighted_requirements: Dict, llm: BaseChatModel, max_workers: int = 4, rate_limiter: Optional[RateLimiter] = None, on_result: Optional[Callable[[Dict], None]] = None, evidence_token_budget: Optional[int] = EVIDENCE_TOKEN_BUDGET, packed: bool = False) -> List[Dict]:
+    """Scores resumes concurrently as they arrive and returns the result dicts in input order; `on_result` is called as each one finishes."""
+    order = {}
+
+    def record_order(resumes):
+        for resume in resumes:
+            order.setdefault(resume['filename'], len(order))
+            yield resume
+
+    results = []
+    for result in iter_scored_candidates(job_description, record_order(resumes), weighted_requirements, llm, max_workers=max_workers, rate_limiter=rate_limiter, evidence_token_budget=evidence_token_budget, packed=packed):
+        results.append(result)
+        if on_result:
+            on_result(result)
+    return sorted(results, key=lambda r: order.get(r['filename'], len(order)))
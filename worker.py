@@ -0,0 +1,216 @@
+"""Process-wide background queue for analysis batches.
+
+Every session submits its batch here instead of scoring on its own script thread. Each task's input (PDF extraction,
+pre-screening) is produced on the task's own thread into a small buffer; a single dispatcher hands the shared worker
+slots to sessions with an item ready in round-robin order, so neither one large upload nor one slow input can hold
+up everyone else, and every call goes through the same rate limiter passed in by the caller.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from metrics import REGISTRY, MetricsRegistry
+
+FINISHED_TASK_TTL_SECONDS = 3600
+
+class AnalysisTask:
+    """One submitted batch: its item source, per-item work, progress counters and results.
+
+    With `batched`, each item's work returns a list of results (for example one per resume of a packed scoring call).
+    `metrics` holds only what this task's input and work reported, while REGISTRY keeps the process-wide totals.
+    """
+    def __init__(self, session_id: str, items: Iterable[Any], work: Callable[[Any], Any], expected: Optional[int] = None, on_result: Optional[Callable[[Any], None]] = None, on_finish: Optional[Callable[["AnalysisTask"], None]] = None, batched: bool = False, notes: Optional[Dict[str, Any]] = None):
+        self.task_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.expected = expected
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.results: List[Any] = []
+        self.notes: Dict[str, Any] = notes if notes is not None else {}
+        self.metrics = MetricsRegistry()
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._items = iter(items)
+        self._work = work
+        self._on_result = on_result
+        self._on_finish = on_finish
+        self._batched = batched
+        self._ready: Deque[Tuple[float, Any]] = deque()  # (time it became ready, item)
+        self._in_flight = 0
+        self._producing = True
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        """Still scoring or being finalised; the UI keeps polling while this is true."""
+        return not self.finished
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "cancelled", "failed")
+
+    @property
+    def drained(self) -> bool:
+        """No item will be dispatched any more: the input is used up, or the task was cancelled or has finished."""
+        return self._cancelled or self.finished or (not self._producing and not self._ready)
+
+    def progress(self) -> Dict[str, Any]:
+        with self._lock:
+            done = len(self.results)
+            return {"status": self.status, "done": done, "in_flight": self._in_flight, "expected": max(self.expected or 0, done + self._in_flight), "cancel_requested": self._cancelled, "error": self.error}
+
+class AnalysisQueue:
+    """Shares `max_workers` slots between all sessions' tasks, round-robin by session."""
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._slots = threading.Semaphore(max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers + 1, thread_name_prefix="analysis")
+        self._condition = threading.Condition()
+        self._sessions: "OrderedDict[str, Deque[AnalysisTask]]" = OrderedDict()
+        self._tasks: Dict[str, AnalysisTask] = {}
+        self._dispatcher = threading.Thread(target=self._dispatch, name="analysis-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, session_id: str, items: Iterable[Any], work: Callable[[Any], Any], expected: Optional[int] = None, on_result: Optional[Callable[[Any], None]] = None, on_finish: Optional[Callable[[AnalysisTask], None]] = None, batched: bool = False, notes: Optional[Dict[str, Any]] = None) -> AnalysisTask:
+        """Queues a batch. `work(item)` runs on a shared worker for each item pulled from `items`.
+
+        `items` is consumed lazily on a thread of the task's own, at most `max_workers` items ahead of the workers.
+        `notes` becomes `task.notes` before anything runs, so the callbacks can fill it in.
+        """
+        task = AnalysisTask(session_id, items, work, expected, on_result, on_finish, batched, notes)
+        with self._condition:
+            self._prune()
+            self._tasks[task.task_id] = task
+            self._sessions.setdefault(session_id, deque()).append(task)
+        threading.Thread(target=self._produce, args=(task,), name=f"analysis-input-{task.task_id[:8]}", daemon=True).start()
+        REGISTRY.inc("analysis_tasks_total", status="submitted")
+        return task
+
+    def get(self, task_id: Optional[str]) -> Optional[AnalysisTask]:
+        with self._condition:
+            return self._tasks.get(task_id) if task_id else None
+
+    def cancel(self, task_id: str):
+        """Stops pulling new items for the task. Items already running finish, and their results are kept."""
+        with self._condition:
+            task = self._tasks.get(task_id)
+            if task is None or task.finished:
+                return
+            task._cancelled = True
+            task._ready.clear()
+            self._condition.notify_all()
+        self._executor.submit(self._maybe_finish, task)  # finalising may be slow; never on the caller's thread
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            active = [task for task in self._tasks.values() if not task.finished]
+            return {"active_tasks": len(active), "sessions": len({task.session_id for task in active}), "in_flight": sum(task._in_flight for task in active)}
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_TASK_TTL_SECONDS
+        for task_id in [task_id for task_id, task in self._tasks.items() if task.finished and task.finished_at < cutoff]:
+            del self._tasks[task_id]
+
+    def _produce(self, task: AnalysisTask):
+        """Pulls the task's items into its ready buffer, waiting while the buffer is full. Runs on the task's own thread."""
+        try:
+            while not task._cancelled:
+                with REGISTRY.recording_to(task.metrics):
+                    item = next(task._items)
+                with self._condition:
+                    while len(task._ready) >= self.max_workers and not task._cancelled:
+                        self._condition.wait()
+                    if task._cancelled:
+                        break
+                    task._ready.append((time.monotonic(), item))
+                    self._condition.notify_all()
+        except StopIteration:
+            pass
+        except Exception as e:
+            print(f"Analysis task {task.task_id} failed while reading its input: {e}")
+            task.error = str(e)
+        finally:
+            if task._cancelled:
+                # Release the input early, for example the PDF extraction pool behind it.
+                close = getattr(task._items, "close", None)
+                if close:
+                    close()
+            with self._condition:
+                task._producing = False
+                self._condition.notify_all()
+            self._maybe_finish(task)
+
+    def _next_item(self) -> Tuple[AnalysisTask, float, Any]:
+        """Blocks until some session's current task has an item ready, takes it and rotates that session to the back.
+
+        Also returns how long the item waited between being ready and being dispatched.
+        """
+        with self._condition:
+            while True:
+                for session_id in list(self._sessions):
+                    tasks = self._sessions[session_id]
+                    while tasks and tasks[0].drained:
+                        tasks.popleft()
+                    if not tasks:
+                        del self._sessions[session_id]
+                        continue
+                    if not tasks[0]._ready:
+                        continue  # its input is still being produced; serve the other sessions meanwhile
+                    task = tasks[0]
+                    with task._lock:  # counted in flight before it leaves the buffer, so the task cannot look finished
+                        ready_at, item = task._ready.popleft()
+                        task._in_flight += 1
+                        if task.status == "queued":
+                            task.status = "running"
+                    self._sessions.move_to_end(session_id)
+                    self._condition.notify_all()  # wakes the task's producer if its buffer was full
+                    return task, time.monotonic() - ready_at, item
+                self._condition.wait()
+
+    def _dispatch(self):
+        while True:
+            self._slots.acquire()
+            task, waited, item = self._next_item()
+            self._executor.submit(self._run, task, waited, item)
+
+    def _run(self, task: AnalysisTask, waited: float, item: Any):
+        try:
+            with REGISTRY.recording_to(task.metrics):
+                REGISTRY.observe("queue_wait_seconds", waited, stage="scoring")
+                results = task._work(item) if task._batched else [task._work(item)]
+                with task._lock:
+                    task.results.extend(results)
+                if task._on_result:
+                    for result in results:
+                        task._on_result(result)
+        except Exception as e:
+            print(f"Analysis task {task.task_id} item failed: {e}")
+        finally:
+            with task._lock:
+                task._in_flight -= 1
+            self._slots.release()
+            self._maybe_finish(task)
+
+    def _maybe_finish(self, task: AnalysisTask):
+        with task._lock:
+            if task.finished or task.status == "finishing" or task._in_flight or task._producing or task._ready:
+                return
+            task.status = "finishing"
+        try:
+            if task._on_finish:
+                task._on_finish(task)
+            status = "failed" if task.error else "cancelled" if task._cancelled else "done"
+        except Exception as e:
+            print(f"Analysis task {task.task_id} could not be finalised: {e}")
+            task.error = str(e)
+            status = "failed"
+        with task._lock:
+            task.status = status
+            task.finished_at = time.time()
+        REGISTRY.inc("analysis_tasks_total", status=status)
+        with self._condition:
+            self._condition.notify_all()